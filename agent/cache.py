@@ -0,0 +1,158 @@
+"""
+Semantic cache - reuses triage results for near-duplicate failures
+"""
+
+import sys
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import atexit
+import pickle
+import threading
+import time
+import weakref
+from typing import Hashable, List, Optional
+import numpy as np
+
+from agent.models import TriageResult
+import config
+
+
+# Caches with results not yet written, saved at exit. Weak references, so
+# registering doesn't keep a cache alive; one collected earlier saves in
+# __del__.
+_OPEN_CACHES: "weakref.WeakSet[SemanticCache]" = weakref.WeakSet()
+
+
+@atexit.register
+def _save_open_caches():
+    """Write results added since the last save"""
+    for cache in list(_OPEN_CACHES):
+        cache.save()
+
+
+class SemanticCache:
+    """Cache of triage results keyed by query-embedding similarity
+    
+    Each entry also carries an exact key; a lookup only matches entries
+    stored under the same key, however similar their vectors are.
+    """
+    
+    def __init__(
+        self,
+        path: Path = config.SEMANTIC_CACHE_PATH,
+        threshold: float = config.SEMANTIC_CACHE_THRESHOLD,
+        ttl_seconds: float = config.SEMANTIC_CACHE_TTL_SECONDS,
+        max_entries: int = config.SEMANTIC_CACHE_MAX_ENTRIES
+    ):
+        self.path = Path(path)
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        
+        self.vecs = np.empty((0, config.EMBEDDING_DIM), dtype=np.float32)
+        self.stamps = np.empty(0, dtype=np.float64)
+        self.results: List[TriageResult] = []
+        self.keys: List[Hashable] = []
+        # Batch analysis looks up and adds entries from several threads
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self._load()
+        _OPEN_CACHES.add(self)
+    
+    def __del__(self):
+        if getattr(self, "_unsaved", 0):
+            self.save()
+    
+    def _load(self):
+        """Load persisted entries, dropping expired ones"""
+        if not self.path.exists():
+            return
+        
+        try:
+            data = np.load(self.path, allow_pickle=True)
+            vecs = data["vecs"].astype(np.float32)
+            stamps = data["stamps"]
+            results = [pickle.loads(r) for r in data["results"]]
+            keys = [pickle.loads(k) for k in data["keys"]]
+        except Exception as e:
+            print(f"⚠️  Ignoring unreadable semantic cache: {e}")
+            return
+        
+        self.vecs, self.stamps, self.results, self.keys = vecs, stamps, results, keys
+        self._prune()
+    
+    def _prune(self):
+        """Drop expired entries, then the oldest beyond max_entries"""
+        keep = np.flatnonzero(self.stamps >= time.time() - self.ttl_seconds)
+        if len(keep) > self.max_entries:
+            keep = keep[len(keep) - self.max_entries:]
+        if len(keep) == len(self.results):
+            return
+        self.vecs = self.vecs[keep]
+        self.stamps = self.stamps[keep]
+        self.results = [self.results[i] for i in keep]
+        self.keys = [self.keys[i] for i in keep]
+    
+    def save(self):
+        """Persist entries to disk, if any were added since the last save"""
+        with self._lock:
+            if not self._unsaved:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            results = np.empty(len(self.results), dtype=object)
+            results[:] = [pickle.dumps(r) for r in self.results]
+            keys = np.empty(len(self.keys), dtype=object)
+            keys[:] = [pickle.dumps(k) for k in self.keys]
+            with open(self.path, "wb") as f:
+                np.savez(
+                    f, vecs=self.vecs, stamps=self.stamps, results=results, keys=keys
+                )
+            self._unsaved = 0
+    
+    @staticmethod
+    def _normalize(vec: np.ndarray) -> np.ndarray:
+        vec = np.asarray(vec, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+    
+    def lookup(
+        self, query_vec: np.ndarray, key: Hashable = None
+    ) -> Optional[TriageResult]:
+        """Return a cached result under key whose query is similar enough"""
+        with self._lock:
+            vecs, stamps = self.vecs, self.stamps
+            results, keys = self.results, self.keys
+        if not results:
+            return None
+        
+        sims = vecs @ self._normalize(query_vec)
+        
+        # Expired entries and entries under another key never match
+        sims[stamps < time.time() - self.ttl_seconds] = -1.0
+        sims[np.fromiter((k != key for k in keys), bool, len(keys))] = -1.0
+        
+        best = int(np.argmax(sims))
+        if sims[best] >= self.threshold:
+            return results[best]
+        return None
+    
+    def add(self, query_vec: np.ndarray, result: TriageResult, key: Hashable = None):
+        """Store a result for a query under key
+        
+        Entries are written every SEMANTIC_CACHE_SAVE_EVERY additions, and
+        whatever is left at exit, rather than rewriting the file each time.
+        """
+        with self._lock:
+            self.vecs = np.vstack([self.vecs, self._normalize(query_vec)])
+            self.stamps = np.append(self.stamps, time.time())
+            self.results = self.results + [result]
+            self.keys = self.keys + [key]
+            self._prune()
+            self._unsaved += 1
+            due = self._unsaved >= config.SEMANTIC_CACHE_SAVE_EVERY
+        if due:
+            self.save()
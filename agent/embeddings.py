@@ -0,0 +1,104 @@
+"""
+ONNX Runtime embedding model - drop-in replacement for HuggingFaceEmbedding
+"""
+
+import sys
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from typing import List
+import numpy as np
+
+try:
+    import onnxruntime as ort
+    from tokenizers import Tokenizer
+    USE_ONNX_RUNTIME = True
+except ImportError:
+    USE_ONNX_RUNTIME = False
+
+import config
+
+
+def onnx_model_available(model_dir: Path = config.ONNX_MODEL_DIR) -> bool:
+    """Whether ONNX Runtime is installed and an exported model exists"""
+    return (
+        USE_ONNX_RUNTIME
+        and (Path(model_dir) / "model.onnx").exists()
+        and (Path(model_dir) / "tokenizer.json").exists()
+    )
+
+
+class OnnxBgeEmbedding:
+    """BGE embeddings computed with ONNX Runtime instead of PyTorch
+    
+    Expects a directory exported with:
+        optimum-cli export onnx --task feature-extraction --optimize O3 \\
+            BAAI/bge-small-en-v1.5 data/onnx-bge-small
+    """
+    
+    def __init__(
+        self,
+        model_dir: Path = config.ONNX_MODEL_DIR,
+        embed_batch_size: int = config.EMBED_BATCH_SIZE,
+        max_length: int = 512
+    ):
+        model_dir = Path(model_dir)
+        self.embed_batch_size = embed_batch_size
+        
+        self._tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self._tokenizer.enable_padding()
+        self._tokenizer.enable_truncation(max_length=max_length)
+        
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        providers = ["CPUExecutionProvider"]
+        if "CUDAExecutionProvider" in ort.get_available_providers():
+            providers.insert(0, "CUDAExecutionProvider")
+        
+        self._session = ort.InferenceSession(
+            str(model_dir / "model.onnx"),
+            sess_options=options,
+            providers=providers
+        )
+        self._input_names = {i.name for i in self._session.get_inputs()}
+    
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """Run one batch through the model"""
+        encodings = self._tokenizer.encode_batch(texts)
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array(
+                [e.attention_mask for e in encodings], dtype=np.int64
+            ),
+            "token_type_ids": np.array(
+                [e.type_ids for e in encodings], dtype=np.int64
+            ),
+        }
+        inputs = {k: v for k, v in inputs.items() if k in self._input_names}
+        
+        hidden = self._session.run(None, inputs)[0]
+        
+        # BGE uses CLS pooling followed by L2 normalization
+        cls = hidden[:, 0].astype(np.float32)
+        return cls / np.linalg.norm(cls, axis=1, keepdims=True)
+    
+    def get_text_embedding_batch(
+        self,
+        texts: List[str],
+        show_progress: bool = False
+    ) -> List[List[float]]:
+        """Embed texts in batches of embed_batch_size"""
+        embeddings = []
+        for start in range(0, len(texts), self.embed_batch_size):
+            batch = texts[start:start + self.embed_batch_size]
+            embeddings.extend(self._embed(batch).tolist())
+        return embeddings
+    
+    def get_text_embedding(self, text: str) -> List[float]:
+        return self.get_text_embedding_batch([text])[0]
+    
+    def get_query_embedding(self, query: str) -> List[float]:
+        return self.get_text_embedding(query)
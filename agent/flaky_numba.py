@@ -0,0 +1,80 @@
+"""
+Vectorized flakiness scoring - the calculate_flaky_score factors over arrays
+"""
+
+import sys
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+
+try:
+    from numba import njit
+    USE_NUMBA = True
+except ImportError:
+    USE_NUMBA = False
+
+# Error types that are often flaky (factor 3 in calculate_flaky_score)
+FLAKY_ERROR_TYPES = ['NetworkError', 'TimeoutError']
+
+
+def _compute_scores_loop(retry_counts, resolved_counts, is_network, history_lens):
+    """Per-row loop, compiled by numba; arrays only, no strings
+    
+    Factors are added in the same order as calculate_flaky_score, in
+    float64, so scores equal its results exactly and thresholds such as
+    0.7 compare the same way.
+    """
+    n = retry_counts.shape[0]
+    scores = np.empty(n, dtype=np.float64)
+    for i in range(n):
+        score = 0.0
+        if retry_counts[i] > 0:
+            score += 0.4
+        if history_lens[i] >= 3:
+            score += 0.3
+        if is_network[i]:
+            score += 0.2
+        if resolved_counts[i] > 0 and history_lens[i] > resolved_counts[i]:
+            score += 0.1
+        scores[i] = min(score, 1.0)
+    return scores
+
+
+def _compute_scores_numpy(retry_counts, resolved_counts, is_network, history_lens):
+    """Same scoring as whole-array numpy operations"""
+    scores = (
+        0.4 * (retry_counts > 0)
+        + 0.3 * (history_lens >= 3)
+        + 0.2 * is_network
+        + 0.1 * ((resolved_counts > 0) & (history_lens > resolved_counts))
+    )
+    return np.minimum(scores, 1.0).astype(np.float64)
+
+
+if USE_NUMBA:
+    _compute_scores = njit(cache=True)(_compute_scores_loop)
+else:
+    _compute_scores = _compute_scores_numpy
+
+
+def compute_scores(
+    retry_counts: np.ndarray,
+    resolved_counts: np.ndarray,
+    is_network: np.ndarray,
+    history_lens: np.ndarray
+) -> np.ndarray:
+    """Flaky score per failure, matching AgentTools.calculate_flaky_score
+
+    history_lens and resolved_counts are the number of stored failures, and
+    resolved ones, for the same test as each row.
+    """
+    return _compute_scores(
+        np.ascontiguousarray(retry_counts, dtype=np.int32),
+        np.ascontiguousarray(resolved_counts, dtype=np.int32),
+        np.ascontiguousarray(is_network, dtype=np.bool_),
+        np.ascontiguousarray(history_lens, dtype=np.int32)
+    )
@@ -10,23 +10,199 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
+import atexit
+import hashlib
 import json
-from typing import List, Optional
+import math
+import threading
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 
-from llama_index.core import VectorStoreIndex, Document, Settings
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.vector_stores.lancedb import LanceDBVectorStore
-import lancedb
+# LlamaIndex, LanceDB and the embedding backends are imported where they
+# are used, so importing this module does not pull in torch
 
-# Add sentence-transformers as fallback
-try:
-    from sentence_transformers import SentenceTransformer
-    USE_SENTENCE_TRANSFORMERS = True
-except ImportError:
-    USE_SENTENCE_TRANSFORMERS = False
+from agent.models import HistoricalFailure, Resolution, FailureType
+import config
 
-from agent.models import HistoricalFailure, Resolution
+
+# Explicit schema so vectors are stored as float32 rather than whatever
+# dtype the embedding wrapper happens to return. Failures are stored as
+# typed columns, so filters push down into the Lance scan and rows are
+# rebuilt without any JSON decoding. Long text columns are LZ4 compressed.
+_LZ4 = {"lance-encoding:compression": "lz4"}
+
+FAILURES_SCHEMA = pa.schema([
+    pa.field("id", pa.string()),
+    pa.field("vector", pa.list_(pa.float32(), config.EMBEDDING_DIM)),
+    pa.field("text", pa.string(), metadata=_LZ4),
+    pa.field("test_name", pa.string()),
+    pa.field("error_message", pa.string(), metadata=_LZ4),
+    pa.field("error_type", pa.dictionary(pa.int32(), pa.string())),
+    pa.field("log_snippet", pa.string(), metadata=_LZ4),
+    pa.field("timestamp", pa.timestamp("us")),
+    pa.field("duration_seconds", pa.float64()),
+    pa.field("retry_count", pa.int32()),
+    pa.field("artifacts", pa.list_(pa.string())),
+    pa.field("ci_run_id", pa.string()),
+    pa.field("branch", pa.string()),
+    pa.field("commit_sha", pa.string()),
+    pa.field("flaky_score", pa.float64()),
+    pa.field("has_resolution", pa.bool_()),
+    pa.field("resolution_root_cause", pa.string()),
+    pa.field("resolution_classification", pa.dictionary(pa.int32(), pa.string())),
+    pa.field("resolution_fix_applied", pa.string()),
+    pa.field("resolution_fixed_by", pa.string()),
+    pa.field("resolution_fixed_at", pa.timestamp("us")),
+    pa.field("resolution_ticket_reference", pa.string()),
+    pa.field("resolution_confidence", pa.float64()),
+])
+
+# Columns needed to rebuild a HistoricalFailure
+FAILURE_COLUMNS = [
+    name for name in FAILURES_SCHEMA.names
+    if name not in ("id", "vector", "text")
+]
+
+
+def _proven_fix_filter(min_confidence: float) -> pc.Expression:
+    """Rows resolved with a confidence above min_confidence"""
+    return pc.field("has_resolution") & (
+        pc.field("resolution_confidence") > min_confidence
+    )
+
+
+def _row_to_failure(row: dict) -> HistoricalFailure:
+    """Rebuild a failure from a row of typed columns"""
+    resolution = None
+    if row["has_resolution"]:
+        resolution = Resolution(
+            root_cause=row["resolution_root_cause"],
+            classification=FailureType(row["resolution_classification"]),
+            fix_applied=row["resolution_fix_applied"],
+            fixed_by=row["resolution_fixed_by"],
+            fixed_at=row["resolution_fixed_at"],
+            ticket_reference=row["resolution_ticket_reference"],
+            confidence=row["resolution_confidence"]
+        )
+    
+    return HistoricalFailure(
+        test_name=row["test_name"],
+        error_message=row["error_message"],
+        error_type=row["error_type"],
+        log_snippet=row["log_snippet"],
+        timestamp=row["timestamp"],
+        duration_seconds=row["duration_seconds"],
+        retry_count=row["retry_count"],
+        artifacts=row["artifacts"],
+        resolution=resolution,
+        ci_run_id=row["ci_run_id"],
+        branch=row["branch"],
+        commit_sha=row["commit_sha"],
+        flaky_score=row["flaky_score"]
+    )
+
+
+@dataclass(frozen=True)
+class FailureBatch:
+    """Failures kept as Arrow columns, only built into objects on demand
+    
+    Behaves like a read-only list of HistoricalFailure, but aggregates can
+    use the columnar accessors without materializing any rows.
+    """
+    table: pa.Table
+    
+    @classmethod
+    def empty(cls) -> 'FailureBatch':
+        return cls(pa.schema(
+            [FAILURES_SCHEMA.field(name) for name in FAILURE_COLUMNS]
+        ).empty_table())
+    
+    def __len__(self) -> int:
+        return self.table.num_rows
+    
+    def __iter__(self) -> Iterator[HistoricalFailure]:
+        for row in self.table.to_pylist():
+            yield _row_to_failure(row)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.row(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return self.row(index)
+    
+    def row(self, index: int) -> HistoricalFailure:
+        """Materialize a single failure"""
+        return _row_to_failure(self.table.slice(index, 1).to_pylist()[0])
+    
+    @property
+    def test_names(self) -> List[str]:
+        return self.table.column("test_name").to_pylist()
+    
+    @property
+    def error_types(self) -> List[Optional[str]]:
+        return self.table.column("error_type").to_pylist()
+    
+    @property
+    def timestamps(self) -> np.ndarray:
+        """datetime64[us] array, no per-row datetime objects"""
+        return self.table.column("timestamp").to_numpy()
+    
+    @property
+    def flaky_scores(self) -> np.ndarray:
+        return self.table.column("flaky_score").to_numpy()
+    
+    @property
+    def has_resolution(self) -> np.ndarray:
+        return self.table.column("has_resolution").to_numpy()
+
+
+# Open memories with buffered inserts to write at exit. Weak references,
+# so registering doesn't keep an instance alive past its last use; an
+# instance collected earlier flushes in __del__.
+_OPEN_MEMORIES: "weakref.WeakSet[FailureMemory]" = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_open_memories():
+    """Write inserts still buffered when the interpreter exits"""
+    for memory in list(_OPEN_MEMORIES):
+        memory.flush()
+
+
+def _select_device() -> str:
+    """Pick the fastest available device for the embedding model"""
+    try:
+        import torch
+    except ImportError:
+        return "cpu"
+    
+    if torch.cuda.is_available():
+        return "cuda"
+    if torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+def _embedding_backend() -> str:
+    """Embedding implementation that would be loaded, e.g. "onnx" or "cuda-fp16"
+    
+    Each backend gives slightly different vectors, so persisted embeddings
+    are kept per backend.
+    """
+    from agent.embeddings import onnx_model_available
+    
+    if onnx_model_available():
+        return "onnx"
+    
+    device = _select_device()
+    # Half precision halves activation traffic on CUDA
+    return "cuda-fp16" if device == "cuda" else device
 
 
 class FailureMemory:
@@ -37,17 +213,19 @@ class FailureMemory:
         self.db_path = Path(db_path)
         self.db_path.mkdir(parents=True, exist_ok=True)
         
-        # Use local embedding model
-        print("🔧 Loading embedding model...")
-        
-        Settings.embed_model = HuggingFaceEmbedding(
-            model_name="BAAI/bge-small-en-v1.5",
-            cache_folder=None,  # Use default cache location
-            embed_batch_size=10,
-            device=None  # Auto-detect CPU/GPU
-        )
+        # Embedding model is loaded lazily, only on an embedding cache miss.
+        # Vectors of stored failures are persisted per model and backend
+        # when they are written, and loaded on the first embedding; query
+        # vectors only live in a bounded in-memory cache.
+        self._embed_model = None
+        self._embed_backend: Optional[str] = None
+        self._embed_cache: Optional[Dict[bytes, np.ndarray]] = None
+        self._embed_cache_dirty = False
+        self._query_cache: OrderedDict = OrderedDict()
+        self._embed_lock = threading.Lock()
         
         # Initialize LanceDB
+        import lancedb
         self.db = lancedb.connect(str(self.db_path))
         
         # Create or load vector store
@@ -58,156 +236,539 @@ class FailureMemory:
             self.table = None
             print("✓ Will create new database on first insert")
         
-        self.index: Optional[VectorStoreIndex] = None
-        self._load_index()
-    
-    def _load_index(self):
-        """Load existing index if available"""
+        if self.table is not None and self.table.schema.names != FAILURES_SCHEMA.names:
+            self._migrate_json_layout()
+        
         if self.table is not None:
-            vector_store = LanceDBVectorStore(
-                uri=str(self.db_path),
-                table_name="failures"
+            self._migrate_storage_version()
+        
+        # Lance dataset handle for filtered scans, reopened only after writes
+        self._dataset = None
+        
+        # Single inserts are buffered and written in batches
+        self._pending: List[HistoricalFailure] = []
+        self._flush_lock = threading.Lock()
+        _OPEN_MEMORIES.add(self)
+    
+    @property
+    def embed_backend(self) -> str:
+        """Embedding backend, detected once without loading the model"""
+        if self._embed_backend is None:
+            self._embed_backend = _embedding_backend()
+        return self._embed_backend
+    
+    @property
+    def _embed_cache_path(self) -> Path:
+        model = config.EMBEDDING_MODEL.replace("/", "--")
+        return self.db_path / f"embed_cache-{model}-{self.embed_backend}.parquet"
+    
+    @property
+    def embed_model(self):
+        """Local embedding model, loaded on first use"""
+        if self._embed_model is None:
+            if self.embed_backend == "onnx":
+                from agent.embeddings import OnnxBgeEmbedding
+                
+                print("🔧 Loading ONNX embedding model...")
+                self._embed_model = OnnxBgeEmbedding()
+                return self._embed_model
+            
+            from llama_index.core import Settings
+            from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+            
+            device = self.embed_backend.split("-")[0]
+            print(f"🔧 Loading embedding model on {device}...")
+            
+            on_gpu = device in ("cuda", "mps")
+            self._embed_model = HuggingFaceEmbedding(
+                model_name=config.EMBEDDING_MODEL,
+                cache_folder=None,  # Use default cache location
+                embed_batch_size=(
+                    config.EMBED_BATCH_SIZE_GPU if on_gpu
+                    else config.EMBED_BATCH_SIZE
+                ),
+                device=device
             )
-            self.index = VectorStoreIndex.from_vector_store(vector_store)
+            
+            if self.embed_backend == "cuda-fp16":
+                self._embed_model._model.half()
+            
+            Settings.embed_model = self._embed_model
+        return self._embed_model
     
-    def add_failure(self, failure: HistoricalFailure) -> str:
-        """Add a failure to memory"""
-        # Convert failure to embedding text
-        text = failure.to_embedding_text()
-        
-        # Create document with metadata
-        doc = Document(
-            text=text,
-            metadata={
-                "test_name": failure.test_name,
-                "error_type": failure.error_type or "unknown",
-                "timestamp": failure.timestamp.isoformat(),
-                "flaky_score": failure.flaky_score,
-                "has_resolution": failure.resolution is not None,
-                "raw_data": json.dumps(failure.to_dict())
+    def _create_table(self, rows: pa.Table, mode: str = "create"):
+        """Create the failures table in the configured Lance file format"""
+        return self.db.create_table(
+            "failures",
+            data=rows,
+            schema=FAILURES_SCHEMA,
+            mode=mode,
+            storage_options={
+                "new_table_data_storage_version": config.LANCE_DATA_STORAGE_VERSION
             }
         )
+    
+    def _migrate_json_layout(self):
+        """Convert a table of raw_data JSON metadata into typed columns
         
-        # Initialize index if needed
-        if self.index is None:
-            vector_store = LanceDBVectorStore(
-                uri=str(self.db_path),
-                table_name="failures"
+        Tables written through LlamaIndex keep each failure as JSON in a
+        metadata struct; the rows are rebuilt from it once and rewritten.
+        """
+        if "metadata" not in self.table.schema.names:
+            raise RuntimeError(
+                f"Failure database at {self.db_path} has an unknown layout: "
+                f"{self.table.schema.names}"
             )
-            self.index = VectorStoreIndex.from_documents(
-                [doc], 
-                vector_store=vector_store
+        
+        print("🔧 Converting failure database to typed columns...")
+        failures = []
+        for metadata in self.table.to_arrow().column("metadata").to_pylist():
+            if isinstance(metadata, str):
+                metadata = json.loads(metadata)
+            failures.append(
+                HistoricalFailure.from_dict(json.loads(metadata["raw_data"]))
             )
-            self.table = self.db.open_table("failures")
-        else:
-            self.index.insert(doc)
         
-        return f"Added: {failure.test_name}"
+        rows = self._build_rows(failures)
+        self.table = self._create_table(rows, mode="overwrite")
+        self._replace_stored_embeddings(rows)
+        self._save_embed_cache()
+        self._ensure_ann_index()
+        print(f"✓ Converted {len(failures)} failures")
     
-    def add_failures_bulk(self, failures: List[HistoricalFailure]):
-        """Add multiple failures efficiently"""
-        documents = []
-        for failure in failures:
-            text = failure.to_embedding_text()
-            doc = Document(
-                text=text,
-                metadata={
-                    "test_name": failure.test_name,
-                    "error_type": failure.error_type or "unknown",
-                    "timestamp": failure.timestamp.isoformat(),
-                    "flaky_score": failure.flaky_score,
-                    "has_resolution": failure.resolution is not None,
-                    "raw_data": json.dumps(failure.to_dict())
-                }
-            )
-            documents.append(doc)
+    def _migrate_storage_version(self):
+        """Rewrite a table written in an older Lance file format"""
+        def parse(version: str):
+            return tuple(int(p) for p in version.split(".") if p.isdigit())
         
-        vector_store = LanceDBVectorStore(
-            uri=str(self.db_path),
-            table_name="failures"
-        )
-        self.index = VectorStoreIndex.from_documents(
-            documents,
-            vector_store=vector_store
+        current = self.table.to_lance().data_storage_version
+        if parse(current) >= parse(config.LANCE_DATA_STORAGE_VERSION):
+            return
+        
+        print(f"🔧 Migrating failure database to Lance format "
+              f"{config.LANCE_DATA_STORAGE_VERSION}...")
+        rows = self.table.to_arrow()
+        self.table = self._create_table(rows, mode="overwrite")
+        
+        # An older lancedb may ignore new_table_data_storage_version, and
+        # then every start would rewrite the table and rebuild its index
+        migrated = self.table.to_lance().data_storage_version
+        if parse(migrated) < parse(config.LANCE_DATA_STORAGE_VERSION):
+            print(f"⚠️  Failure database is still Lance format {migrated}; this "
+                  f"lancedb can't write {config.LANCE_DATA_STORAGE_VERSION}. "
+                  f"Upgrade lancedb or lower LANCE_DATA_STORAGE_VERSION.")
+            return
+        
+        self._ensure_ann_index()
+    
+    def _ensure_ann_index(self):
+        """Build an IVF-PQ index once the table is too large for a flat scan
+        
+        Rows added after a build are searched exactly alongside the index,
+        so it is only rebuilt once the table has doubled since.
+        """
+        if self.table is None:
+            return
+        
+        total = self.table.count_rows()
+        if total < config.ANN_INDEX_MIN_ROWS:
+            return
+        
+        # Overwriting the table drops its index, which resets this check
+        for index in self.table.list_indices():
+            if index.columns == ["vector"]:
+                indexed_rows = self.table.index_stats(index.name).num_indexed_rows
+                if total < indexed_rows * 2:
+                    return
+        
+        print(f"🔧 Building ANN index over {total} failures...")
+        self.table.create_index(
+            metric="cosine",
+            vector_column_name="vector",
+            num_partitions=int(math.sqrt(total)),
+            num_sub_vectors=16
         )
+    
+    def _load_embed_cache(self) -> Dict[bytes, np.ndarray]:
+        """Load persisted embeddings keyed by sha256 of the embedding text"""
+        if not self._embed_cache_path.exists():
+            return {}
         
-        # Now try to open the table after it's created
+        import pyarrow.parquet as pq
         try:
-            self.table = self.db.open_table("failures")
+            table = pq.read_table(self._embed_cache_path)
         except Exception as e:
-            print(f"⚠️  Note: {e}")
-            # Table will be accessible through the index
+            print(f"⚠️  Ignoring unreadable embedding cache: {e}")
+            return {}
+        
+        hashes = table.column("hash").to_pylist()
+        vectors = (
+            table.column("vector").combine_chunks().flatten()
+            .to_numpy().reshape(-1, config.EMBEDDING_DIM)
+        )
+        return dict(zip(hashes, vectors))
+    
+    def _save_embed_cache(self):
+        """Write the stored-failure embeddings back to disk, if any were added"""
+        import pyarrow.parquet as pq
+        
+        with self._embed_lock:
+            if self._embed_cache is None or not self._embed_cache_dirty:
+                return
+            hashes = list(self._embed_cache.keys())
+            vectors = np.asarray(
+                list(self._embed_cache.values()), dtype=np.float32
+            ).ravel()
+            self._embed_cache_dirty = False
+        
+        table = pa.table({
+            "hash": pa.array(hashes, type=pa.binary(32)),
+            "vector": pa.FixedSizeListArray.from_arrays(
+                pa.array(vectors, type=pa.float32()), config.EMBEDDING_DIM
+            )
+        })
+        pq.write_table(table, self._embed_cache_path)
+    
+    def _embed_texts(self, texts: List[str], stored: bool = False) -> np.ndarray:
+        """Embed texts, only running the model for texts not already cached
+        
+        stored marks texts of failures being written to the table; their
+        vectors go to the persisted cache instead of the query cache.
+        """
+        hashes = [hashlib.sha256(t.encode()).digest() for t in texts]
+        
+        # Batch analysis embeds from several threads; the lock also keeps
+        # the model from being loaded twice
+        with self._embed_lock:
+            if self._embed_cache is None:
+                self._embed_cache = self._load_embed_cache()
+            
+            found = {}
+            missing = {}
+            for h, text in zip(hashes, texts):
+                vector = self._embed_cache.get(h)
+                if vector is None and h in self._query_cache:
+                    self._query_cache.move_to_end(h)
+                    vector = self._query_cache[h]
+                if vector is None:
+                    missing[h] = text
+                else:
+                    found[h] = vector
+            
+            if missing:
+                vectors = self.embed_model.get_text_embedding_batch(
+                    list(missing.values()), show_progress=False
+                )
+                for h, vector in zip(missing.keys(), vectors):
+                    found[h] = np.asarray(vector, dtype=np.float32)
+            
+            if stored:
+                for h in hashes:
+                    if h not in self._embed_cache:
+                        self._embed_cache[h] = found[h]
+                        self._embed_cache_dirty = True
+                        self._query_cache.pop(h, None)
+            else:
+                for h in missing:
+                    self._query_cache[h] = found[h]
+                while len(self._query_cache) > config.EMBED_QUERY_CACHE_SIZE:
+                    self._query_cache.popitem(last=False)
+            
+            return np.stack([found[h] for h in hashes])
+    
+    def embed_failure(self, failure: HistoricalFailure) -> np.ndarray:
+        """Embedding vector for a single failure"""
+        return self._embed_texts([failure.to_embedding_text()])[0]
+    
+    def _replace_stored_embeddings(self, rows: pa.Table):
+        """After an overwrite, keep only the embeddings of the rows now stored
+        
+        Row ids are the hex sha256 of the embedding text, the cache key.
+        """
+        hashes = [bytes.fromhex(row_id) for row_id in rows.column("id").to_pylist()]
+        vectors = (
+            rows.column("vector").combine_chunks().flatten()
+            .to_numpy().reshape(-1, config.EMBEDDING_DIM)
+        )
+        with self._embed_lock:
+            self._embed_cache = dict(zip(hashes, vectors))
+            self._embed_cache_dirty = True
+    
+    def _build_rows(self, failures: List[HistoricalFailure]) -> pa.Table:
+        """Build an Arrow table of failures with their float32 embeddings"""
+        texts = [failure.to_embedding_text() for failure in failures]
+        vectors = self._embed_texts(texts, stored=True)
+        
+        resolutions = [f.resolution for f in failures]
+        
+        return pa.table({
+            "id": [hashlib.sha256(t.encode()).hexdigest() for t in texts],
+            "vector": pa.FixedSizeListArray.from_arrays(
+                pa.array(vectors.ravel(), type=pa.float32()),
+                config.EMBEDDING_DIM
+            ),
+            "text": texts,
+            "test_name": [f.test_name for f in failures],
+            "error_message": [f.error_message for f in failures],
+            "error_type": [f.error_type for f in failures],
+            "log_snippet": [f.log_snippet for f in failures],
+            "timestamp": [f.timestamp for f in failures],
+            "duration_seconds": [f.duration_seconds for f in failures],
+            "retry_count": [f.retry_count for f in failures],
+            "artifacts": [f.artifacts for f in failures],
+            "ci_run_id": [f.ci_run_id for f in failures],
+            "branch": [f.branch for f in failures],
+            "commit_sha": [f.commit_sha for f in failures],
+            "flaky_score": [f.flaky_score for f in failures],
+            "has_resolution": [r is not None for r in resolutions],
+            "resolution_root_cause": [r and r.root_cause for r in resolutions],
+            "resolution_classification": [
+                r and r.classification.value for r in resolutions
+            ],
+            "resolution_fix_applied": [r and r.fix_applied for r in resolutions],
+            "resolution_fixed_by": [r and r.fixed_by for r in resolutions],
+            "resolution_fixed_at": [r and r.fixed_at for r in resolutions],
+            "resolution_ticket_reference": [
+                r and r.ticket_reference for r in resolutions
+            ],
+            "resolution_confidence": [r and r.confidence for r in resolutions]
+        }, schema=FAILURES_SCHEMA)
+    
+    def __enter__(self) -> 'FailureMemory':
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def __del__(self):
+        # Inserts queued on a memory dropped before exit would be lost
+        if getattr(self, "_pending", None):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️  Could not write {len(self._pending)} queued failures: {e}")
+    
+    def close(self):
+        """Write queued failures; the memory stays usable afterwards"""
+        self.flush()
+        _OPEN_MEMORIES.discard(self)
+    
+    def add_failure(self, failure: HistoricalFailure) -> str:
+        """Queue a failure for memory; it is written on the next flush"""
+        # flush() swaps the queue out on other threads, so appends share its lock
+        with self._flush_lock:
+            self._pending.append(failure)
+            full = len(self._pending) >= config.INSERT_FLUSH_SIZE
+        if full:
+            self.flush()
+        
+        return f"Queued: {failure.test_name}"
+    
+    def flush(self):
+        """Embed and write buffered failures in a single batch"""
+        # Lookups may run on several threads, and each one flushes first
+        with self._flush_lock:
+            if not self._pending:
+                return
+            
+            rows = self._build_rows(self._pending)
+            self._pending = []
+            
+            if self.table is None:
+                self.table = self._create_table(rows)
+            else:
+                self.table.add(rows)
+            self._dataset = None
+            
+            self._save_embed_cache()
+            self._ensure_ann_index()
+    
+    def add_failures_bulk(self, failures: List[HistoricalFailure]):
+        """Add multiple failures efficiently, replacing existing contents"""
+        # Buffered single inserts are kept rather than overwritten
+        with self._flush_lock:
+            rows = self._build_rows(self._pending + failures)
+            self._pending = []
+            
+            self.table = self._create_table(rows, mode="overwrite")
+            self._dataset = None
+            
+            self._replace_stored_embeddings(rows)
+            self._save_embed_cache()
+            self._ensure_ann_index()
         
         print(f"✓ Added {len(failures)} failures to memory")
     
-    def search_similar(
-        self, 
+    def _ranked_candidates(
+        self,
         query_failure: HistoricalFailure,
-        top_k: int = 5
-    ) -> List[HistoricalFailure]:
-        """Find similar past failures"""
-        if self.index is None:
-            return []
+        top_k: int
+    ) -> pa.Table:
+        """Vector search candidates for a query, exactly reranked, best first"""
+        query_vector = self.embed_failure(query_failure)
         
-        query_text = query_failure.to_embedding_text()
+        # Query LanceDB directly so the ANN index is used when present,
+        # oversampling so PQ approximation errors can be reranked away
+        candidates = (
+            self.table.search(query_vector)
+            .metric("cosine")
+            .limit(top_k * config.ANN_RERANK_OVERSAMPLE)
+            .nprobes(config.ANN_NPROBES)
+            .select(FAILURE_COLUMNS + ["vector", "_distance"])
+            .to_arrow()
+        )
+        if candidates.num_rows == 0:
+            return candidates.select(FAILURE_COLUMNS)
         
-        # Use retriever instead of query_engine (no LLM needed)
-        retriever = self.index.as_retriever(similarity_top_k=top_k)
-        nodes = retriever.retrieve(query_text)
+        # Exact cosine rerank of all candidates in a single matrix-vector product
+        cand = (
+            candidates.column("vector").combine_chunks().flatten()
+            .to_numpy().reshape(-1, config.EMBEDDING_DIM)
+        )
+        cand = cand / np.maximum(np.linalg.norm(cand, axis=1, keepdims=True), 1e-12)
+        scores = cand @ (query_vector / max(np.linalg.norm(query_vector), 1e-12))
         
-        # Extract failures from results
-        similar_failures = []
-        for node in nodes:
+        return candidates.select(FAILURE_COLUMNS).take(np.argsort(-scores, kind="stable"))
+    
+    @staticmethod
+    def _rows_to_failures(rows: pa.Table) -> List[HistoricalFailure]:
+        """Build failures from candidate rows, skipping unreadable ones"""
+        failures = []
+        for row in rows.to_pylist():
             try:
-                raw_data = json.loads(node.metadata['raw_data'])
-                failure = HistoricalFailure.from_dict(raw_data)
-                similar_failures.append(failure)
+                failures.append(_row_to_failure(row))
             except Exception as e:
                 print(f"⚠️  Error parsing result: {e}")
                 continue
-        
-        return similar_failures
+        return failures
     
-    def get_flaky_tests(self, threshold: float = 0.6) -> List[HistoricalFailure]:
-        """Get tests with high flaky scores"""
+    def search_similar(
+        self, 
+        query_failure: HistoricalFailure,
+        top_k: int = 5,
+        min_resolution_confidence: Optional[float] = None
+    ) -> List[HistoricalFailure]:
+        """Find similar past failures
+        
+        With min_resolution_confidence set, candidates without a resolution
+        above it are dropped from the Arrow candidates, before any failure
+        objects are built.
+        """
+        self.flush()
         if self.table is None:
             return []
         
-        results = self.table.search().where(
-            f"flaky_score >= {threshold}"
-        ).limit(10).to_list()
+        ranked = self._ranked_candidates(query_failure, top_k)
+        if min_resolution_confidence is not None:
+            ranked = ranked.filter(_proven_fix_filter(min_resolution_confidence))
         
-        failures = []
-        for result in results:
-            try:
-                raw_data = json.loads(result['metadata']['raw_data'])
-                failures.append(HistoricalFailure.from_dict(raw_data))
-            except:
-                continue
+        return self._rows_to_failures(ranked.slice(0, top_k))
+    
+    def search_similar_with_fixes(
+        self,
+        query_failure: HistoricalFailure,
+        top_k: int,
+        fix_top_k: int,
+        min_resolution_confidence: float
+    ) -> Tuple[List[HistoricalFailure], List[HistoricalFailure]]:
+        """Similar failures, and the closest with a proven fix, from one search
         
-        return failures
+        Proven fixes are picked from all the oversampled candidates, so one
+        vector search serves both lists.
+        """
+        self.flush()
+        if self.table is None:
+            return [], []
+        
+        ranked = self._ranked_candidates(query_failure, top_k)
+        fixes = ranked.filter(_proven_fix_filter(min_resolution_confidence))
+        
+        return (
+            self._rows_to_failures(ranked.slice(0, top_k)),
+            self._rows_to_failures(fixes.slice(0, fix_top_k))
+        )
+    
+    def get_flaky_tests(self, threshold: float = 0.6, limit: int = 10) -> FailureBatch:
+        """Get tests with high flaky scores
+        
+        Each failure's score is the higher of its stored flaky_score and
+        one recomputed from the test's stored history, so tests that keep
+        failing are found even if they were stored with a low score.
+        """
+        from agent.flaky_numba import compute_scores, FLAKY_ERROR_TYPES
+        
+        self.flush()
+        if self.table is None:
+            return FailureBatch.empty()
+        
+        if self._dataset is None:
+            self._dataset = self.table.to_lance()
+        
+        # Only the small scoring columns are read for the whole table
+        cols = self._dataset.to_table(columns=[
+            "test_name", "error_type", "retry_count", "has_resolution", "flaky_score"
+        ])
+        if cols.num_rows == 0:
+            return FailureBatch.empty()
+        
+        # Per-test history length and resolved count, broadcast back to rows
+        test_ids = (
+            pc.dictionary_encode(cols.column("test_name")).combine_chunks()
+            .indices.to_numpy()
+        )
+        resolved = cols.column("has_resolution").to_numpy()
+        history_lens = np.bincount(test_ids)[test_ids]
+        resolved_counts = np.bincount(test_ids, weights=resolved)[test_ids]
+        is_network = pc.fill_null(pc.is_in(
+            cols.column("error_type").cast(pa.string()),
+            value_set=pa.array(FLAKY_ERROR_TYPES)
+        ), False).to_numpy()
+        
+        scores = np.maximum(
+            cols.column("flaky_score").to_numpy(),
+            compute_scores(
+                cols.column("retry_count").to_numpy(),
+                resolved_counts, is_network, history_lens
+            )
+        )
+        
+        flaky = np.flatnonzero(scores >= threshold)
+        flaky = flaky[np.argsort(-scores[flaky], kind="stable")][:limit]
+        
+        rows = self._dataset.take(flaky, columns=FAILURE_COLUMNS)
+        rows = rows.set_column(
+            rows.schema.get_field_index("flaky_score"), "flaky_score",
+            pa.array(scores[flaky], type=pa.float64())
+        )
+        return FailureBatch(rows)
     
-    def get_by_test_name(self, test_name: str) -> List[HistoricalFailure]:
+    def get_by_test_name(self, test_name: str) -> FailureBatch:
         """Get all failures for a specific test"""
+        self.flush()
         if self.table is None:
-            return []
+            return FailureBatch.empty()
         
-        results = self.table.search().where(
-            f"test_name = '{test_name}'"
-        ).limit(20).to_list()
+        # Expression filter, so quotes in test names need no escaping
+        return self._scan_failures(pc.field("test_name") == test_name, limit=20)
+    
+    def _scan_failures(self, filter: pc.Expression, limit: int) -> FailureBatch:
+        """Filtered scan that only reads the rows that match"""
+        # The predicate runs inside the Lance scan on native columns, so
+        # only surviving rows are read
+        if self._dataset is None:
+            self._dataset = self.table.to_lance()
         
-        failures = []
-        for result in results:
-            try:
-                raw_data = json.loads(result['metadata']['raw_data'])
-                failures.append(HistoricalFailure.from_dict(raw_data))
-            except:
-                continue
+        rows = self._dataset.scanner(
+            filter=filter,
+            columns=FAILURE_COLUMNS,
+            limit=limit
+        ).to_table()
         
-        return failures
+        return FailureBatch(rows)
     
     def get_stats(self) -> dict:
         """Get memory statistics"""
+        self.flush()
         if self.table is None:
             return {"total_failures": 0}
         
@@ -3,13 +3,25 @@ Data models for storing failures and resolutions
 Save as: agent/models.py
 """
 
-from dataclasses import dataclass, asdict
-from datetime import datetime
+from dataclasses import dataclass
+from datetime import datetime, timedelta
 from typing import Optional, List, Dict
 from enum import Enum
 import json
 
 
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _to_datetime(value) -> datetime:
+    """Accept a datetime, Arrow-style int64 microseconds, or an ISO string"""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, int):
+        return _EPOCH + timedelta(microseconds=value)
+    return datetime.fromisoformat(value)
+
+
 class FailureType(Enum):
     """Classification of failure types"""
     TIMEOUT = "timeout"
@@ -41,16 +53,21 @@ class Resolution:
     confidence: float = 0.8
     
     def to_dict(self) -> Dict:
-        d = asdict(self)
-        d['classification'] = self.classification.value
-        if self.fixed_at:
-            d['fixed_at'] = self.fixed_at.isoformat()
-        return d
+        # Built by hand: asdict() recursively deep-copies every field
+        return {
+            'root_cause': self.root_cause,
+            'classification': self.classification.value,
+            'fix_applied': self.fix_applied,
+            'fixed_by': self.fixed_by,
+            'fixed_at': self.fixed_at.isoformat() if self.fixed_at else None,
+            'ticket_reference': self.ticket_reference,
+            'confidence': self.confidence
+        }
     
     @classmethod
     def from_dict(cls, data: Dict) -> 'Resolution':
         if 'fixed_at' in data and data['fixed_at']:
-            data['fixed_at'] = datetime.fromisoformat(data['fixed_at'])
+            data['fixed_at'] = _to_datetime(data['fixed_at'])
         if 'classification' in data:
             data['classification'] = FailureType(data['classification'])
         return cls(**data)
@@ -80,15 +97,25 @@ class HistoricalFailure:
     flaky_score: float = 0.0
     
     def to_dict(self) -> Dict:
-        d = asdict(self)
-        d['timestamp'] = self.timestamp.isoformat()
-        if self.resolution:
-            d['resolution'] = self.resolution.to_dict()
-        return d
+        return {
+            'test_name': self.test_name,
+            'error_message': self.error_message,
+            'error_type': self.error_type,
+            'log_snippet': self.log_snippet,
+            'timestamp': self.timestamp.isoformat(),
+            'duration_seconds': self.duration_seconds,
+            'retry_count': self.retry_count,
+            'artifacts': list(self.artifacts),
+            'resolution': self.resolution.to_dict() if self.resolution else None,
+            'ci_run_id': self.ci_run_id,
+            'branch': self.branch,
+            'commit_sha': self.commit_sha,
+            'flaky_score': self.flaky_score
+        }
     
     @classmethod
     def from_dict(cls, data: Dict) -> 'HistoricalFailure':
-        data['timestamp'] = datetime.fromisoformat(data['timestamp'])
+        data['timestamp'] = _to_datetime(data['timestamp'])
         if data.get('resolution'):
             # Only convert if it's a dict (not already a Resolution object)
             if isinstance(data['resolution'], dict):
@@ -97,21 +124,18 @@ class HistoricalFailure:
     
     def to_embedding_text(self) -> str:
         """Generate text for embedding - combines all relevant context"""
-        parts = [
-            f"Test: {self.test_name}",
-            f"Error: {self.error_message}",
-            f"Type: {self.error_type or 'unknown'}",
-            f"Log: {self.log_snippet}",
-        ]
-        
+        # Single formatting pass, rebuilt on each call since fields may change
+        text = (
+            f"Test: {self.test_name} | Error: {self.error_message} | "
+            f"Type: {self.error_type or 'unknown'} | Log: {self.log_snippet}"
+        )
         if self.resolution:
-            parts.extend([
-                f"Root Cause: {self.resolution.root_cause}",
-                f"Classification: {self.resolution.classification.value}",
-                f"Fix: {self.resolution.fix_applied}"
-            ])
-        
-        return " | ".join(parts)
+            text += (
+                f" | Root Cause: {self.resolution.root_cause}"
+                f" | Classification: {self.resolution.classification.value}"
+                f" | Fix: {self.resolution.fix_applied}"
+            )
+        return text
     
     def get_summary(self) -> str:
         """Human-readable summary"""
@@ -9,38 +9,57 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
-from typing import List, Optional
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from typing import List, Optional, Sequence, TYPE_CHECKING
 from agent.models import (
     HistoricalFailure, 
     TriageResult, 
     FailureType,
     Resolution
 )
-from agent.memory import FailureMemory
 from agent.tools import AgentTools
+from agent.cache import SemanticCache
 import config
 
-try:
-    from llama_index.llms.ollama import Ollama
-except ImportError:
-    print("⚠️  LlamaIndex not installed")
-    Ollama = None
+# FailureMemory and Ollama pull in torch/LlamaIndex, so they are imported
+# only where an agent is actually built
+if TYPE_CHECKING:
+    from agent.memory import FailureMemory
+
+# End of a sentence in streamed LLM output: punctuation, whitespace, then
+# a capital letter. Requiring the next sentence to have started skips a
+# decimal point or "..." at the end of a partial response, and list
+# numbers ("1. ") and abbreviations ("e.g. ", "etc. ") are excluded.
+_SENTENCE_END = re.compile(
+    r'(?<!\d)(?<!\b[A-Za-z])(?<!\betc)(?<!\bvs)[.!?]\s+(?=[A-Z])'
+)
 
 
 class TriageAgent:
     """AI agent that triages test failures"""
     
-    def __init__(self, memory: FailureMemory):
+    def __init__(self, memory: "FailureMemory", use_cache: bool = True):
         self.memory = memory
         self.tools = AgentTools(memory)
+        self.semantic_cache = SemanticCache() if use_cache else None
+        self._executor = ThreadPoolExecutor(max_workers=2)
         
         # Initialize local LLM (Ollama)
+        try:
+            from llama_index.llms.ollama import Ollama
+        except ImportError:
+            print("⚠️  LlamaIndex not installed")
+            Ollama = None
+        
         if Ollama:
             self.llm = Ollama(
                 model=config.LLM_MODEL,
                 base_url=config.LLM_BASE_URL,
                 temperature=config.LLM_TEMPERATURE,
-                request_timeout=120.0
+                request_timeout=120.0,
+                additional_kwargs={"num_predict": config.LLM_EXPLANATION_MAX_TOKENS}
             )
         else:
             self.llm = None
@@ -57,25 +76,50 @@ class TriageAgent:
         """
         reasoning_steps = []
         
+        # Reuse a prior analysis if this failure is a near-duplicate of the
+        # same test, error type and retry count, analysed with the same LLM
+        # setting. Flakiness depends on history, so it is always recomputed.
+        query_vec = None
+        cache_key = (
+            failure.test_name, failure.error_type, failure.retry_count,
+            self.llm is not None
+        )
+        if self.semantic_cache is not None:
+            query_vec = self.memory.embed_failure(failure)
+            cached = self.semantic_cache.lookup(query_vec, cache_key)
+            if cached is not None:
+                return self._refresh_cached(failure, cached)
+        
         # Step 1: Gather evidence
         reasoning_steps.append("Gathering evidence from logs and error messages")
         
-        # Step 2: Search for similar failures
+        # Steps 2-3 are independent lookups, so the vector search and the
+        # history scan run concurrently while we classify on this thread
+        
+        # Step 2: Search for similar failures, and proven fixes among the
+        # same vector search candidates
         reasoning_steps.append("Searching for similar past failures in memory")
-        similar_failures = self.tools.search_similar_failures(failure, top_k=5)
+        similar_future = self._executor.submit(
+            self.tools.search_similar_and_proven_fixes, failure, 5, 2
+        )
         
         # Step 3: Get test history
         reasoning_steps.append(f"Retrieving history for test: {failure.test_name}")
-        history = self.tools.get_test_history(failure.test_name)
-        
-        # Step 4: Calculate flakiness
-        reasoning_steps.append("Calculating flakiness probability")
-        flaky_score = self.tools.calculate_flaky_score(failure, history)
+        history_future = self._executor.submit(
+            self.tools.get_test_history, failure.test_name
+        )
         
-        # Step 5: Classify failure type
+        # Step 4: Classify failure type (CPU-only, overlaps the lookups)
         reasoning_steps.append("Classifying failure type")
         failure_type = self.tools.classify_error_type(failure)
         
+        similar_failures, proven_fixes = similar_future.result()
+        history = history_future.result()
+        
+        # Step 5: Calculate flakiness
+        reasoning_steps.append("Calculating flakiness probability")
+        flaky_score = self.tools.calculate_flaky_score(failure, history)
+        
         # Step 6: Generate root cause explanation with LLM
         reasoning_steps.append("Generating root cause explanation")
         root_cause = self._generate_root_cause_explanation(
@@ -85,7 +129,7 @@ class TriageAgent:
         # Step 7: Suggest actions
         reasoning_steps.append("Determining actionable next steps")
         actions = self.tools.suggest_actions(
-            failure_type, flaky_score, similar_failures
+            failure_type, flaky_score, proven_fixes
         )
         
         # Step 8: Calculate confidence
@@ -93,7 +137,7 @@ class TriageAgent:
             failure_type, similar_failures, flaky_score
         )
         
-        return TriageResult(
+        result = TriageResult(
             test_name=failure.test_name,
             classification=failure_type,
             flaky_probability=flaky_score,
@@ -103,12 +147,41 @@ class TriageAgent:
             similar_failures=similar_failures[:3],
             reasoning_steps=reasoning_steps
         )
+        
+        if self.semantic_cache is not None:
+            self.semantic_cache.add(query_vec, result, cache_key)
+        
+        return result
+    
+    def _refresh_cached(
+        self,
+        failure: HistoricalFailure,
+        cached: TriageResult
+    ) -> TriageResult:
+        """Cached result with flakiness and what depends on it recomputed"""
+        history = self.tools.get_test_history(failure.test_name)
+        flaky_score = self.tools.calculate_flaky_score(failure, history)
+        
+        return replace(
+            cached,
+            flaky_probability=flaky_score,
+            suggested_actions=self.tools.suggest_actions(
+                cached.classification, flaky_score, cached.similar_failures
+            ),
+            confidence_score=self._calculate_confidence(
+                cached.classification, cached.similar_failures, flaky_score
+            ),
+            reasoning_steps=[
+                "Reused analysis of a near-identical past query",
+                "Recalculated flakiness probability from current history"
+            ]
+        )
     
     def _generate_root_cause_explanation(
         self,
         failure: HistoricalFailure,
         similar_failures: List[HistoricalFailure],
-        history: List[HistoricalFailure],
+        history: Sequence[HistoricalFailure],
         failure_type: FailureType
     ) -> str:
         """Generate natural language explanation of root cause"""
@@ -133,8 +206,7 @@ Focus on:
 Root cause explanation:"""
             
             try:
-                response = self.llm.complete(prompt)
-                return response.text.strip()
+                return self._stream_explanation(prompt)
             except Exception as e:
                 print(f"⚠️  LLM error: {e}")
                 # Fallback to rule-based
@@ -144,6 +216,21 @@ Root cause explanation:"""
             failure, similar_failures, failure_type
         )
     
+    def _stream_explanation(self, prompt: str) -> str:
+        """Stream the LLM response and stop once enough sentences arrive"""
+        max_sentences = config.LLM_EXPLANATION_MAX_SENTENCES
+        text = ""
+        for chunk in self.llm.stream_complete(prompt):
+            text = chunk.text
+            ends = [m.start() + 1 for m in _SENTENCE_END.finditer(text)]
+            if len(ends) >= max_sentences:
+                # Drop the start of the next sentence sent in the same chunk
+                return text[:ends[max_sentences - 1]].strip()
+        
+        # The stream ended first, so the whole response is kept, including
+        # a last sentence with nothing after its full stop
+        return text.strip()
+    
     def _rule_based_explanation(
         self,
         failure: HistoricalFailure,
@@ -207,7 +294,7 @@ Root cause explanation:"""
         # Higher confidence if we have resolved similar failures
         resolved_similar = [
             f for f in similar_failures 
-            if f.resolution and f.resolution.confidence > 0.7
+            if f.resolution and f.resolution.confidence > config.PROVEN_FIX_CONFIDENCE
         ]
         if resolved_similar:
             confidence += 0.3
@@ -223,18 +310,11 @@ Root cause explanation:"""
         return max(0.1, min(1.0, confidence))
 
 
-def analyze_failure_file(log_file: str) -> TriageResult:
-    """Convenience function to analyze a log file"""
-    from pathlib import Path
-    from ingestion.log_parser import LogParser
+def failure_from_parsed_log(parsed) -> HistoricalFailure:
+    """Convert a parsed log into a HistoricalFailure for analysis"""
     from datetime import datetime
     
-    # Parse log file
-    parser = LogParser()
-    parsed = parser.parse_file(Path(log_file))
-    
-    # Convert to HistoricalFailure
-    failure = HistoricalFailure(
+    return HistoricalFailure(
         test_name=parsed.test_name,
         error_message=parsed.failure_message,
         error_type=parsed.error_type,
@@ -245,6 +325,19 @@ def analyze_failure_file(log_file: str) -> TriageResult:
         artifacts=parsed.artifacts,
         resolution=None
     )
+
+
+def analyze_failure_file(log_file: str) -> TriageResult:
+    """Convenience function to analyze a log file"""
+    from pathlib import Path
+    from ingestion.log_parser import parse_file
+    from agent.memory import FailureMemory
+    
+    # Parse log file
+    parsed = parse_file(Path(log_file))
+    
+    # Convert to HistoricalFailure
+    failure = failure_from_parsed_log(parsed)
     
     # Initialize agent and analyze
     memory = FailureMemory()
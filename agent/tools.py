@@ -9,36 +9,167 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
-from typing import List, Dict, Optional
-from agent.models import HistoricalFailure, FailureType
-from agent.memory import FailureMemory
-import re
+from typing import List, Dict, Optional, Sequence, Tuple, TYPE_CHECKING
+import io
+from agent.models import HistoricalFailure, FailureType, TriageResult
+import config
+
+# RE2 matches in linear time, so hostile CI logs can't trigger backtracking
+try:
+    import re2 as re
+except ImportError:
+    import re
+
+try:
+    import ahocorasick
+    USE_AHOCORASICK = True
+except ImportError:
+    USE_AHOCORASICK = False
+
+if TYPE_CHECKING:
+    from agent.memory import FailureMemory, FailureBatch
+
+# Evidence text per field is capped to keep LLM prompts short
+MAX_EVIDENCE_CHARS = 400
+
+# Selector patterns in priority order, compiled once. Each is paired with
+# the literal it starts with so messages without it skip the regex.
+_SELECTOR_PATTERNS = (
+    ('selector', re.compile(r'selector ["\']([^"\']+)["\']')),
+    ('element', re.compile(r'element ["\']([^"\']+)["\']')),
+    ('locator', re.compile(r'locator ["\']([^"\']+)["\']')),
+)
+
+# Classification keywords per category
+_KW_TIMEOUT = ('timeout', 'timed out', 'exceeded')
+_KW_SELECTOR = ('selector', 'not found', 'element', 'locator')
+_KW_NETWORK = ('network', 'connection', 'etimedout', 'econnrefused')
+_KW_DATA_SETUP = ('database', 'duplicate key', 'constraint', 'data')
+_KW_ENVIRONMENT = ('environment', 'config', 'permission')
+
+# Categories in priority order - the first category with a hit wins
+CLASSIFIER_KEYWORDS = (
+    (FailureType.TIMEOUT, _KW_TIMEOUT),
+    (FailureType.SELECTOR, _KW_SELECTOR),
+    (FailureType.NETWORK, _KW_NETWORK),
+    (FailureType.DATA_SETUP, _KW_DATA_SETUP),
+    (FailureType.ENVIRONMENT, _KW_ENVIRONMENT),
+)
+
+# Tokens that identify their category on their own. Other keywords, like
+# 'data' or 'element', show up in unrelated errors, so a single-category
+# match only skips the full pipeline when one of these is present.
+_FAST_TRIAGE_KEYWORDS = {
+    'econnrefused': FailureType.NETWORK,
+    'etimedout': FailureType.NETWORK,
+    'duplicate key': FailureType.DATA_SETUP,
+}
+
+# Same table as ASCII bytes for the pure-Python path
+_CLASSIFIER_KEYWORD_BYTES = tuple(
+    (failure_type, tuple(keyword.encode('ascii') for keyword in keywords))
+    for failure_type, keywords in CLASSIFIER_KEYWORDS
+)
+
+# Suggested actions per failure type
+_TYPE_ACTIONS = {
+    FailureType.TIMEOUT: (
+        "Increase wait timeout (consider animation/loading time)",
+        "Add explicit wait for element state (visible/stable)",
+    ),
+    FailureType.SELECTOR: (
+        "Update selector - UI may have changed",
+        "Check recent deployments for UI changes",
+        "Use more stable selectors (data-testid, aria-label)",
+    ),
+    FailureType.NETWORK: (
+        "Add retry logic with exponential backoff",
+        "Check CI environment network stability",
+    ),
+    FailureType.DATA_SETUP: (
+        "Review test data setup - ensure cleanup between runs",
+        "Use unique identifiers to prevent conflicts",
+        "Add database reset in test teardown",
+    ),
+    FailureType.ENVIRONMENT: (
+        "Check environment configuration",
+        "Verify dependencies and services are running",
+    ),
+}
+
+# Extra action per failure type once the flaky score exceeds a threshold
+_FLAKY_TYPE_ACTIONS = {
+    FailureType.TIMEOUT: (0.6, "Test is flaky - add retry logic or investigate root cause"),
+    FailureType.NETWORK: (0.7, "Highly flaky - investigate environment or mock network calls"),
+}
+
+
+def _resolved_count(history: Sequence[HistoricalFailure]) -> int:
+    """Number of resolved failures, read from the column for a FailureBatch"""
+    if hasattr(history, "has_resolution"):
+        return int(history.has_resolution.sum())
+    return sum(1 for h in history if h.resolution is not None)
+
+
+def _build_classifier_automaton():
+    """Build one Aho-Corasick automaton over every classifier keyword
+    
+    Each keyword maps to its category's index in CLASSIFIER_KEYWORDS, so the
+    lowest index matched is the category the if/elif chain would have picked.
+    """
+    automaton = ahocorasick.Automaton()
+    for idx, (_, keywords) in enumerate(CLASSIFIER_KEYWORDS):
+        for keyword in keywords:
+            automaton.add_word(keyword, idx)
+    automaton.make_automaton()
+    return automaton
 
 
 class AgentTools:
     """Collection of tools for failure analysis"""
     
-    def __init__(self, memory: FailureMemory):
+    def __init__(self, memory: "FailureMemory"):
         self.memory = memory
+        self._classifier = _build_classifier_automaton() if USE_AHOCORASICK else None
     
     def search_similar_failures(
         self, 
         current_failure: HistoricalFailure,
-        top_k: int = 5
+        top_k: int = 5,
+        min_resolution_confidence: Optional[float] = None
     ) -> List[HistoricalFailure]:
         """Search for similar past failures"""
-        return self.memory.search_similar(current_failure, top_k=top_k)
+        return self.memory.search_similar(
+            current_failure,
+            top_k=top_k,
+            min_resolution_confidence=min_resolution_confidence
+        )
     
-    def get_test_history(self, test_name: str) -> List[HistoricalFailure]:
+    def search_similar_and_proven_fixes(
+        self,
+        current_failure: HistoricalFailure,
+        top_k: int = 5,
+        fix_top_k: int = 2
+    ) -> Tuple[List[HistoricalFailure], List[HistoricalFailure]]:
+        """Similar past failures plus the closest ones with a proven fix"""
+        return self.memory.search_similar_with_fixes(
+            current_failure, top_k, fix_top_k, config.PROVEN_FIX_CONFIDENCE
+        )
+    
+    def get_test_history(self, test_name: str) -> "FailureBatch":
         """Get all historical failures for a specific test"""
         return self.memory.get_by_test_name(test_name)
     
     def calculate_flaky_score(
         self, 
         current_failure: HistoricalFailure,
-        history: List[HistoricalFailure]
+        history: Sequence[HistoricalFailure]
     ) -> float:
-        """Calculate flakiness probability based on patterns"""
+        """Calculate flakiness probability based on patterns
+        
+        A FailureBatch history has its resolutions counted from the
+        has_resolution column, without building any failures.
+        """
         score = 0.0
         
         # Factor 1: Retry success in current run
@@ -54,7 +185,7 @@ class AgentTools:
             score += 0.2
         
         # Factor 4: Same error appears and disappears
-        resolved_count = sum(1 for h in history if h.resolution is not None)
+        resolved_count = _resolved_count(history)
         if resolved_count > 0 and len(history) > resolved_count:
             score += 0.1
         
@@ -62,43 +193,112 @@ class AgentTools:
     
     def extract_selector_from_error(self, error_message: str) -> Optional[str]:
         """Extract CSS/XPath selector from error message"""
-        patterns = [
-            r'selector ["\']([^"\']+)["\']',
-            r'element ["\']([^"\']+)["\']',
-            r'locator ["\']([^"\']+)["\']'
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, error_message)
+        for hint, pattern in _SELECTOR_PATTERNS:
+            if hint not in error_message:
+                continue
+            match = pattern.search(error_message)
             if match:
                 return match.group(1)
         return None
     
     def classify_error_type(self, failure: HistoricalFailure) -> FailureType:
         """Classify failure into predefined types"""
-        error_text = (failure.error_message + " " + failure.log_snippet).lower()
+        error_text = failure.error_message + " " + failure.log_snippet
+        
+        # Single pass over the text for all categories
+        if self._classifier is not None:
+            best = None
+            for _, idx in self._classifier.iter(error_text.lower()):
+                if best is None or idx < best:
+                    best = idx
+                    # Category 0 can't be beaten, stop scanning
+                    if best == 0:
+                        break
+            if best is None:
+                return FailureType.UNKNOWN
+            return CLASSIFIER_KEYWORDS[best][0]
+        
+        # Keywords are ASCII, and substring search on bytes is cheaper than
+        # on str; 'replace' keeps non-ASCII characters as word separators.
+        # A per-category alternation regex measured ~2x slower than these
+        # memchr-backed `in` tests with re, and no faster with re2.
+        error_bytes = error_text.encode('ascii', 'replace').lower()
+        for failure_type, keywords in _CLASSIFIER_KEYWORD_BYTES:
+            if any(word in error_bytes for word in keywords):
+                return failure_type
         
-        # Timeout issues
-        if any(word in error_text for word in ['timeout', 'timed out', 'exceeded']):
-            return FailureType.TIMEOUT
+        return FailureType.UNKNOWN
+    
+    def _matching_categories(self, failure: HistoricalFailure) -> List[FailureType]:
+        """Every category with at least one keyword hit, in priority order"""
+        error_text = failure.error_message + " " + failure.log_snippet
         
-        # Selector issues
-        if any(word in error_text for word in ['selector', 'not found', 'element', 'locator']):
-            return FailureType.SELECTOR
+        if self._classifier is not None:
+            hits = {idx for _, idx in self._classifier.iter(error_text.lower())}
+            return [CLASSIFIER_KEYWORDS[idx][0] for idx in sorted(hits)]
+        
+        error_bytes = error_text.encode('ascii', 'replace').lower()
+        return [
+            failure_type for failure_type, keywords in _CLASSIFIER_KEYWORD_BYTES
+            if any(word in error_bytes for word in keywords)
+        ]
+    
+    def _has_unambiguous_keyword(
+        self, failure: HistoricalFailure, failure_type: FailureType
+    ) -> bool:
+        """Whether the failure text has a whitelisted token for failure_type"""
+        error_text = (failure.error_message + " " + failure.log_snippet).lower()
+        return any(
+            keyword in error_text
+            for keyword, keyword_type in _FAST_TRIAGE_KEYWORDS.items()
+            if keyword_type == failure_type
+        )
+    
+    def fast_triage(self, failure: HistoricalFailure) -> Optional[TriageResult]:
+        """Triage obvious failures without memory search or the LLM
         
-        # Network issues
-        if any(word in error_text for word in ['network', 'connection', 'etimedout', 'econnrefused']):
-            return FailureType.NETWORK
+        Returns None unless the failure is a network/timeout error that
+        passed on retry, or its text matches exactly one category and
+        contains one of that category's _FAST_TRIAGE_KEYWORDS.
+        """
+        retried_flake = (
+            failure.error_type in ('NetworkError', 'TimeoutError')
+            and failure.retry_count > 0
+        )
+        categories = self._matching_categories(failure)
         
-        # Data setup issues
-        if any(word in error_text for word in ['database', 'duplicate key', 'constraint', 'data']):
-            return FailureType.DATA_SETUP
+        if retried_flake:
+            failure_type = self.classify_error_type(failure)
+            root_cause = (
+                f"{failure.error_type} that passed after {failure.retry_count} "
+                f"retr{'y' if failure.retry_count == 1 else 'ies'}. This points to "
+                f"an intermittent {failure_type.value} problem rather than a regression."
+            )
+        elif len(categories) == 1 and self._has_unambiguous_keyword(
+            failure, categories[0]
+        ):
+            failure_type = categories[0]
+            root_cause = (
+                f"The error only matches {failure_type.value} patterns: "
+                f"{failure.error_message}"
+            )
+        else:
+            return None
         
-        # Environment issues
-        if any(word in error_text for word in ['environment', 'config', 'permission']):
-            return FailureType.ENVIRONMENT
+        flaky_score = self.calculate_flaky_score(failure, [])
         
-        return FailureType.UNKNOWN
+        return TriageResult(
+            test_name=failure.test_name,
+            classification=failure_type,
+            flaky_probability=flaky_score,
+            root_cause_explanation=root_cause,
+            suggested_actions=self.suggest_actions(failure_type, flaky_score, []),
+            confidence_score=config.HIGH_CONFIDENCE,
+            similar_failures=[],
+            reasoning_steps=[
+                "Fast triage: unambiguous failure, skipped memory search and LLM"
+            ]
+        )
     
     def suggest_actions(
         self, 
@@ -111,37 +311,16 @@ class AgentTools:
         
         # Learn from similar failures
         for similar in similar_failures[:2]:
-            if similar.resolution and similar.resolution.confidence > 0.7:
+            if similar.resolution and similar.resolution.confidence > config.PROVEN_FIX_CONFIDENCE:
                 actions.append(
                     f"Apply similar fix: {similar.resolution.fix_applied}"
                 )
         
         # Type-specific actions
-        if failure_type == FailureType.TIMEOUT:
-            actions.append("Increase wait timeout (consider animation/loading time)")
-            actions.append("Add explicit wait for element state (visible/stable)")
-            if flaky_score > 0.6:
-                actions.append("Test is flaky - add retry logic or investigate root cause")
-        
-        elif failure_type == FailureType.SELECTOR:
-            actions.append("Update selector - UI may have changed")
-            actions.append("Check recent deployments for UI changes")
-            actions.append("Use more stable selectors (data-testid, aria-label)")
-        
-        elif failure_type == FailureType.NETWORK:
-            actions.append("Add retry logic with exponential backoff")
-            actions.append("Check CI environment network stability")
-            if flaky_score > 0.7:
-                actions.append("Highly flaky - investigate environment or mock network calls")
-        
-        elif failure_type == FailureType.DATA_SETUP:
-            actions.append("Review test data setup - ensure cleanup between runs")
-            actions.append("Use unique identifiers to prevent conflicts")
-            actions.append("Add database reset in test teardown")
-        
-        elif failure_type == FailureType.ENVIRONMENT:
-            actions.append("Check environment configuration")
-            actions.append("Verify dependencies and services are running")
+        actions.extend(_TYPE_ACTIONS.get(failure_type, ()))
+        flaky_action = _FLAKY_TYPE_ACTIONS.get(failure_type)
+        if flaky_action is not None and flaky_score > flaky_action[0]:
+            actions.append(flaky_action[1])
         
         # Flakiness-specific actions
         if flaky_score > 0.75:
@@ -159,30 +338,35 @@ class AgentTools:
         self,
         current_failure: HistoricalFailure,
         similar_failures: List[HistoricalFailure],
-        history: List[HistoricalFailure]
+        history: Sequence[HistoricalFailure]
     ) -> str:
         """Build evidence summary for LLM context"""
-        evidence = []
+        # Written straight into one buffer rather than a list of lines
+        buf = io.StringIO()
+        w = buf.write
         
-        evidence.append(f"CURRENT FAILURE:")
-        evidence.append(f"Test: {current_failure.test_name}")
-        evidence.append(f"Error: {current_failure.error_message}")
-        evidence.append(f"Type: {current_failure.error_type}")
-        evidence.append(f"Log snippet: {current_failure.log_snippet}")
-        evidence.append(f"Retries: {current_failure.retry_count}")
+        w("CURRENT FAILURE:\nTest: ")
+        w(current_failure.test_name)
+        w("\nError: ")
+        w(current_failure.error_message)
+        w(f"\nType: {current_failure.error_type}\nLog snippet: ")
+        w(current_failure.log_snippet[:MAX_EVIDENCE_CHARS])
+        w(f"\nRetries: {current_failure.retry_count}")
         
         if similar_failures:
-            evidence.append(f"\nSIMILAR PAST FAILURES ({len(similar_failures)}):")
+            w(f"\n\nSIMILAR PAST FAILURES ({len(similar_failures)}):")
             for i, similar in enumerate(similar_failures[:3], 1):
-                evidence.append(f"{i}. {similar.test_name}")
-                evidence.append(f"   Error: {similar.error_message}")
+                w(f"\n{i}. {similar.test_name}\n   Error: ")
+                w(similar.error_message[:MAX_EVIDENCE_CHARS])
                 if similar.resolution:
-                    evidence.append(f"   Root cause: {similar.resolution.root_cause}")
-                    evidence.append(f"   Fix applied: {similar.resolution.fix_applied}")
+                    w("\n   Root cause: ")
+                    w(similar.resolution.root_cause)
+                    w("\n   Fix applied: ")
+                    w(similar.resolution.fix_applied)
         
         if history:
-            evidence.append(f"\nTEST HISTORY ({len(history)} past failures)")
-            resolved = sum(1 for h in history if h.resolution is not None)
-            evidence.append(f"Resolved: {resolved}/{len(history)}")
+            resolved = _resolved_count(history)
+            w(f"\n\nTEST HISTORY ({len(history)} past failures)")
+            w(f"\nResolved: {resolved}/{len(history)}")
         
-        return "\n".join(evidence)
\ No newline at end of file
+        return buf.getvalue()
\ No newline at end of file
@@ -4,7 +4,12 @@ Main CLI interface for AI Test Triage Agent
 Save as: cli.py (in project root)
 """
 
+import os
+import re
 import sys
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 # Add project root to path
@@ -15,15 +20,20 @@ from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
 from rich.progress import Progress, SpinnerColumn, TextColumn
-from datetime import datetime
+from rich.markup import escape
+from rich.text import Text
 
-from agent.planner import TriageAgent, analyze_failure_file
-from agent.memory import FailureMemory
-from agent.models import HistoricalFailure, FailureType
-from ingestion.log_parser import LogParser
+# Agent, memory and parser modules are imported inside the commands that
+# use them, so e.g. `cli.py stats` never loads the analysis stack
+from agent.models import HistoricalFailure
+import config
 
 console = Console()
 
+# Error-signature normalization: run-specific numbers and paths are dropped
+_SIGNATURE_NUMBERS = re.compile(r'\d+')
+_SIGNATURE_PATHS = re.compile(r'(?:/[\w.-]+)+')
+
 
 @click.group()
 def cli():
@@ -35,8 +45,15 @@ def cli():
 @click.argument('log_file', type=click.Path(exists=True))
 @click.option('--verbose', '-v', is_flag=True, help='Show detailed reasoning steps')
 @click.option('--no-llm', is_flag=True, help='Skip LLM explanation (faster)')
-def analyze(log_file, verbose, no_llm):
+@click.option('--no-fast-triage', is_flag=True,
+              help='Always run the full pipeline, even for obvious failures')
+@click.option('--no-cache', is_flag=True, help='Ignore cached results of similar failures')
+def analyze(log_file, verbose, no_llm, no_fast_triage, no_cache):
     """Analyze a test failure log file"""
+    from agent.planner import TriageAgent, failure_from_parsed_log
+    from agent.memory import FailureMemory
+    from agent.tools import AgentTools
+    from ingestion.log_parser import parse_file
     
     console.print("\n[bold cyan]🤖 AI Test Triage Agent[/bold cyan]\n")
     console.print(f"📄 Analyzing: [yellow]{log_file}[/yellow]\n")
@@ -50,36 +67,31 @@ def analyze(log_file, verbose, no_llm):
         task1 = progress.add_task("Parsing log file...", total=None)
         
         # Parse the log
-        parser = LogParser()
-        parsed = parser.parse_file(Path(log_file))
+        parsed = parse_file(Path(log_file))
         progress.update(task1, completed=True)
         
         task2 = progress.add_task("Loading historical data...", total=None)
         
         # Convert to HistoricalFailure
-        failure = HistoricalFailure(
-            test_name=parsed.test_name,
-            error_message=parsed.failure_message,
-            error_type=parsed.error_type,
-            log_snippet="\n".join(parsed.error_lines[:5]),
-            timestamp=datetime.now(),
-            duration_seconds=parsed.duration_seconds,
-            retry_count=parsed.retry_count,
-            artifacts=parsed.artifacts,
-            resolution=None
-        )
+        failure = failure_from_parsed_log(parsed)
         progress.update(task2, completed=True)
         
         task3 = progress.add_task("Analyzing failure...", total=None)
         
-        # Initialize agent and analyze
-        memory = FailureMemory()
-        agent = TriageAgent(memory)
+        # Obvious failures don't need memory, embeddings or the LLM
+        result = None
+        if not no_fast_triage:
+            result = AgentTools(memory=None).fast_triage(failure)
         
-        if no_llm:
-            agent.llm = None
-        
-        result = agent.analyze(failure)
+        if result is None:
+            # Initialize agent and analyze
+            memory = FailureMemory()
+            agent = TriageAgent(memory, use_cache=not no_cache)
+            
+            if no_llm:
+                agent.llm = None
+            
+            result = agent.analyze(failure)
         progress.update(task3, completed=True)
     
     # Display results
@@ -89,8 +101,11 @@ def analyze(log_file, verbose, no_llm):
 @cli.command()
 @click.argument('directory', type=click.Path(exists=True))
 @click.option('--limit', '-l', default=10, help='Max files to analyze')
-def batch(directory, limit):
+@click.option('--no-cache', is_flag=True, help='Analyze every file, even repeated failures')
+def batch(directory, limit, no_cache):
     """Analyze multiple log files in a directory"""
+    from agent.planner import TriageAgent
+    from agent.memory import FailureMemory
     
     console.print("\n[bold cyan]🤖 Batch Analysis Mode[/bold cyan]\n")
     
@@ -102,23 +117,39 @@ def batch(directory, limit):
     
     console.print(f"Found {len(log_files)} log files\n")
     
-    # Initialize agent once
+    # Initialize agent once, shared by every file
     memory = FailureMemory()
-    agent = TriageAgent(memory)
+    agent = TriageAgent(memory, use_cache=not no_cache)
+    
+    # Repeated failures across files are analyzed once
+    analyze_fn = agent.analyze
+    if not no_cache:
+        analyze_fn = _signature_cached(agent.analyze)
     
-    results = []
+    results = {}
+    workers = min(config.BATCH_MAX_WORKERS, os.cpu_count() or 1)
     
     with Progress(console=console) as progress:
         task = progress.add_task("Analyzing...", total=len(log_files))
         
-        for log_file in log_files:
-            try:
-                result = analyze_failure_file(str(log_file))
-                results.append((log_file.name, result))
-            except Exception as e:
-                console.print(f"[red]Error analyzing {log_file.name}: {e}[/red]")
-            
-            progress.advance(task)
+        # Files are independent; parsing, embedding, vector search and LLM
+        # calls for different files overlap
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(_one_file, analyze_fn, log_file): log_file
+                for log_file in log_files
+            }
+            for future in as_completed(futures):
+                log_file = futures[future]
+                try:
+                    results[log_file] = future.result()
+                except Exception as e:
+                    console.print(f"[red]Error analyzing {log_file.name}: {e}[/red]")
+                
+                progress.advance(task)
+    
+    # Report in directory order, not completion order
+    results = [results[f] for f in log_files if f in results]
     
     # Display summary
     _display_batch_summary(results)
@@ -127,6 +158,7 @@ def batch(directory, limit):
 @cli.command()
 def stats():
     """Show memory statistics"""
+    from agent.memory import FailureMemory
     
     console.print("\n[bold cyan]📊 Memory Statistics[/bold cyan]\n")
     
@@ -147,7 +179,12 @@ def stats():
 @cli.command()
 @click.option('--threshold', '-t', default=0.6, help='Flaky score threshold')
 def flaky(threshold):
-    """List tests with high flakiness scores"""
+    """List tests with high flakiness scores
+    
+    A failure's score is max(stored score, score recomputed from its
+    test's history). Recomputing reads the whole failure table.
+    """
+    from agent.memory import FailureMemory
     
     console.print(f"\n[bold cyan]🔄 Flaky Tests (score > {threshold})[/bold cyan]\n")
     
@@ -163,105 +200,187 @@ def flaky(threshold):
     table.add_column("Flaky Score", style="yellow")
     table.add_column("Error Type", style="red")
     
-    for test in flaky_tests:
+    # Read straight from the columns, no need to build each failure
+    for test_name, flaky_score, error_type in zip(
+        flaky_tests.test_names, flaky_tests.flaky_scores, flaky_tests.error_types
+    ):
         table.add_row(
-            test.test_name,
-            f"{test.flaky_score:.1%}",
-            test.error_type or "Unknown"
+            test_name,
+            f"{flaky_score:.1%}",
+            error_type or "Unknown"
         )
     
     console.print(table)
     console.print()
 
 
+def _one_file(analyze_fn, log_file):
+    """Parse and analyze one log file, returning (file name, result)"""
+    from agent.planner import failure_from_parsed_log
+    from ingestion.log_parser import parse_file
+    
+    failure = failure_from_parsed_log(parse_file(log_file))
+    return log_file.name, analyze_fn(failure)
+
+
+def _error_signature(failure: HistoricalFailure) -> tuple:
+    """Key identifying repeats of the same failure across CI runs"""
+    message = _SIGNATURE_PATHS.sub('PATH', failure.error_message[:200])
+    return (
+        failure.test_name,
+        failure.error_type,
+        failure.retry_count > 0,  # Passed on retry, so scored as flaky
+        _SIGNATURE_NUMBERS.sub('N', message)
+    )
+
+
+def _signature_cached(analyze_fn, maxsize: int = config.ANALYSIS_CACHE_SIZE):
+    """Wrap analyze_fn so failures sharing an error signature run once
+    
+    Each signature maps to a future. Concurrent calls for a signature that
+    is still being analysed wait on it instead of all missing the cache.
+    """
+    futures: "OrderedDict[tuple, Future]" = OrderedDict()
+    lock = threading.Lock()
+    
+    def analyze(failure):
+        signature = _error_signature(failure)
+        with lock:
+            future = futures.get(signature)
+            owner = future is None
+            if owner:
+                future = futures[signature] = Future()
+                if len(futures) > maxsize:
+                    futures.popitem(last=False)
+            else:
+                futures.move_to_end(signature)
+        
+        if owner:
+            try:
+                future.set_result(analyze_fn(failure))
+            except Exception as e:
+                # Waiters see the error, later calls retry
+                future.set_exception(e)
+                with lock:
+                    if futures.get(signature) is future:
+                        del futures[signature]
+        return future.result()
+    
+    return analyze
+
+
 def _display_result(result, verbose=False):
     """Display triage result in formatted output"""
     
-    # Classification panel
-    classification_text = f"""
-[bold]Test:[/bold] {result.test_name}
+    # Rendered into the console buffer and written out once at the end
+    with console:
+        # Classification panel
+        classification_text = f"""
+[bold]Test:[/bold] {escape(result.test_name)}
 [bold]Classification:[/bold] {result.classification.value}
 [bold]Flaky Probability:[/bold] {result.flaky_probability:.1%}
 [bold]Confidence:[/bold] {result.confidence_score:.1%}
 """
-    
-    console.print(Panel(
-        classification_text.strip(),
-        title="📋 Classification",
-        border_style="cyan"
-    ))
-    console.print()
-    
-    # Root cause
-    console.print(Panel(
-        result.root_cause_explanation,
-        title="🔍 Root Cause Analysis",
-        border_style="yellow"
-    ))
-    console.print()
-    
-    # Suggested actions
-    actions_text = "\n".join([f"{i}. {action}" for i, action in enumerate(result.suggested_actions, 1)])
-    console.print(Panel(
-        actions_text,
-        title="✅ Suggested Actions",
-        border_style="green"
-    ))
-    console.print()
-    
-    # Similar failures
-    if result.similar_failures:
-        console.print("[bold cyan]📚 Similar Past Failures:[/bold cyan]\n")
         
-        for i, similar in enumerate(result.similar_failures, 1):
-            console.print(f"  [cyan]{i}. {similar.test_name}[/cyan]")
-            console.print(f"     Error: {similar.error_message[:80]}...")
-            if similar.resolution:
-                console.print(f"     [green]Fix: {similar.resolution.fix_applied}[/green]")
-            console.print()
-    
-    # Reasoning steps (verbose mode)
-    if verbose and result.reasoning_steps:
-        console.print("[bold cyan]🧠 Reasoning Steps:[/bold cyan]\n")
-        for i, step in enumerate(result.reasoning_steps, 1):
-            console.print(f"  {i}. {step}")
+        console.print(Panel(
+            classification_text.strip(),
+            title="📋 Classification",
+            border_style="cyan"
+        ))
         console.print()
+        
+        # Root cause (plain Text, so LLM output is never parsed as markup)
+        console.print(Panel(
+            Text(result.root_cause_explanation),
+            title="🔍 Root Cause Analysis",
+            border_style="yellow"
+        ))
+        console.print()
+        
+        # Suggested actions
+        actions_text = "\n".join(
+            f"{i}. {action}" for i, action in enumerate(result.suggested_actions, 1)
+        )
+        console.print(Panel(
+            Text(actions_text),
+            title="✅ Suggested Actions",
+            border_style="green"
+        ))
+        console.print()
+        
+        # Similar failures
+        if result.similar_failures:
+            console.print("[bold cyan]📚 Similar Past Failures:[/bold cyan]\n")
+            
+            for i, similar in enumerate(result.similar_failures, 1):
+                lines = Text.assemble(
+                    (f"  {i}. {similar.test_name}", "cyan"),
+                    f"\n     Error: {similar.error_message[:80]}..."
+                )
+                if similar.resolution:
+                    lines.append(
+                        f"\n     Fix: {similar.resolution.fix_applied}", style="green"
+                    )
+                console.print(lines)
+                console.print()
+        
+        # Reasoning steps (verbose mode)
+        if verbose and result.reasoning_steps:
+            console.print("[bold cyan]🧠 Reasoning Steps:[/bold cyan]\n")
+            console.print(Text("\n".join(
+                f"  {i}. {step}" for i, step in enumerate(result.reasoning_steps, 1)
+            )))
+            console.print()
+
+
+# Batch summary columns: (header, style)
+_BATCH_COLUMNS = (
+    ("Log File", "cyan"),
+    ("Test", "white"),
+    ("Classification", "yellow"),
+    ("Flaky", "red"),
+    ("Confidence", "green"),
+)
 
 
 def _display_batch_summary(results):
     """Display summary of batch analysis"""
     
-    console.print("\n[bold cyan]📊 Batch Analysis Summary[/bold cyan]\n")
-    
-    table = Table(show_header=True)
-    table.add_column("Log File", style="cyan")
-    table.add_column("Test", style="white")
-    table.add_column("Classification", style="yellow")
-    table.add_column("Flaky", style="red")
-    table.add_column("Confidence", style="green")
-    
-    for log_name, result in results:
-        table.add_row(
-            log_name,
-            result.test_name[:30],
-            result.classification.value,
-            f"{result.flaky_probability:.0%}",
-            f"{result.confidence_score:.0%}"
-        )
-    
-    console.print(table)
-    console.print()
-    
-    # Statistics
-    classifications = {}
-    for _, result in results:
-        cls = result.classification.value
-        classifications[cls] = classifications.get(cls, 0) + 1
-    
-    console.print("[bold]Classification Breakdown:[/bold]")
-    for cls, count in classifications.items():
-        console.print(f"  • {cls}: {count}")
-    console.print()
+    with console:
+        console.print("\n[bold cyan]📊 Batch Analysis Summary[/bold cyan]\n")
+        
+        table = Table(show_header=True)
+        for header, style in _BATCH_COLUMNS:
+            table.add_column(header, style=style)
+        
+        # Cell values are formatted once up front; the classification column
+        # also feeds the breakdown below
+        rows = [
+            (
+                log_name,
+                result.test_name[:30],
+                result.classification.value,
+                f"{result.flaky_probability:.0%}",
+                f"{result.confidence_score:.0%}"
+            )
+            for log_name, result in results
+        ]
+        
+        # Cells are plain Text, so file and test names skip markup parsing
+        for row in rows:
+            table.add_row(*map(Text, row))
+        
+        console.print(table)
+        console.print()
+        
+        # Statistics
+        classifications = Counter(row[2] for row in rows)
+        
+        console.print("[bold]Classification Breakdown:[/bold]")
+        console.print(Text("\n".join(
+            f"  • {cls}: {count}" for cls, count in classifications.items()
+        )))
+        console.print()
 
 
 if __name__ == "__main__":
@@ -12,24 +12,48 @@ LOGS_DIR = DEMO_DIR / "sample_ci_failures"
 
 # RAG settings
 EMBEDDING_MODEL = "BAAI/bge-small-en-v1.5"  # Fast, local embeddings
+EMBEDDING_DIM = 384  # Output size of bge-small
+ONNX_MODEL_DIR = DATA_DIR / "onnx-bge-small"  # Used instead of PyTorch if present
 VECTOR_DB_PATH = DATA_DIR / "failures_db"
 SIMILARITY_TOP_K = 5
+LANCE_DATA_STORAGE_VERSION = "2.2"  # Lance file format for new tables
+EMBED_BATCH_SIZE = 64  # Texts per embedding model forward pass
+EMBED_BATCH_SIZE_GPU = 128
+INSERT_FLUSH_SIZE = 32  # Buffered single inserts written per batch
+ANN_INDEX_MIN_ROWS = 1024  # Below this a flat vector scan is fast enough
+ANN_NPROBES = 16  # IVF partitions probed per query
+ANN_RERANK_OVERSAMPLE = 4  # Candidates fetched per result for exact rerank
+EMBED_QUERY_CACHE_SIZE = 1024  # Query embeddings kept in memory, never persisted
+
+# Semantic cache of triage results
+SEMANTIC_CACHE_PATH = DATA_DIR / "semantic_cache.npz"
+SEMANTIC_CACHE_THRESHOLD = 0.92  # Cosine similarity needed to reuse a result
+SEMANTIC_CACHE_TTL_SECONDS = 7 * 24 * 3600
+SEMANTIC_CACHE_MAX_ENTRIES = 2000  # Oldest results are dropped beyond this
+SEMANTIC_CACHE_SAVE_EVERY = 16  # New results written per save; rest at exit
 
 # LLM settings (Ollama)
 LLM_MODEL = "llama3.2:3b"  # or "mistral", "llama3.1"
 LLM_BASE_URL = "http://20.42.209.235:11434"
 LLM_TEMPERATURE = 0.1  # Low temperature for consistent analysis
 LLM_MAX_TOKENS = 2000
+LLM_EXPLANATION_MAX_TOKENS = 128  # Root-cause explanations are ~60 tokens
+LLM_EXPLANATION_MAX_SENTENCES = 3  # Stop streaming after this many
 
 # Flakiness detection thresholds
 FLAKY_RETRY_THRESHOLD = 2  # If test passes after N retries, likely flaky
 FLAKY_PATTERN_THRESHOLD = 3  # If same test fails N times in history, check flakiness
 FLAKY_SCORE_HIGH = 0.75  # Confidence threshold for "high flakiness"
 
+# Batch analysis
+BATCH_MAX_WORKERS = 8  # Log files analyzed concurrently (capped at CPU count)
+ANALYSIS_CACHE_SIZE = 4096  # Error signatures remembered per batch run
+
 # Classification confidence thresholds
 HIGH_CONFIDENCE = 0.8
 MEDIUM_CONFIDENCE = 0.5
 LOW_CONFIDENCE = 0.3
+PROVEN_FIX_CONFIDENCE = 0.7  # Past fixes above this are suggested directly
 
 # Ensure directories exist
 DATA_DIR.mkdir(exist_ok=True)
@@ -12,14 +12,19 @@ project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict
 from dataclasses import dataclass
 from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
 
-from agent.planner import analyze_failure_file
+from agent.planner import TriageAgent, failure_from_parsed_log
+from agent.memory import FailureMemory
 from agent.models import FailureType
+from ingestion.log_parser import parse_file
+import config
 
 console = Console()
 
@@ -27,6 +32,12 @@ console = Console()
 @dataclass
 class EvalResult:
     """Result of evaluating one test case"""
+    # Declared by hand rather than slots=True to keep Python 3.9 support
+    __slots__ = (
+        'case_id', 'case_name', 'passed', 'errors', 'classification_correct',
+        'flaky_score_correct', 'keywords_found', 'actions_found', 'confidence_ok'
+    )
+    
     case_id: str
     case_name: str
     passed: bool
@@ -57,25 +68,41 @@ class EvaluationSuite:
         
         golden_cases = self.load_golden_cases()
         
-        for case in golden_cases:
-            console.print(f"Testing: [yellow]{case['name']}[/yellow]")
-            result = self._evaluate_case(case)
-            self.results.append(result)
+        # Load memory and the embedding model once, outside the cases.
+        # Cached results would score earlier runs, not the current agent.
+        agent = TriageAgent(FailureMemory(), use_cache=False)
+        
+        # Cases are independent, so they run concurrently on the shared agent
+        workers = min(config.BATCH_MAX_WORKERS, os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(
+                lambda case: self._evaluate_case(case, agent),
+                golden_cases
+            )
             
-            if result.passed:
-                console.print("  ✅ PASSED\n")
-            else:
-                console.print(f"  ❌ FAILED: {', '.join(result.errors)}\n")
+            for case, result in zip(golden_cases, results):
+                console.print(f"Testing: [yellow]{case['name']}[/yellow]")
+                self.results.append(result)
+                
+                if result.passed:
+                    console.print("  ✅ PASSED\n")
+                else:
+                    console.print(f"  ❌ FAILED: {', '.join(result.errors)}\n")
         
         return self.results
     
-    def _evaluate_case(self, case: Dict) -> EvalResult:
+    def _evaluate_case(
+        self,
+        case: Dict,
+        agent: TriageAgent
+    ) -> EvalResult:
         """Evaluate a single test case"""
         errors = []
         
         try:
             # Run agent analysis
-            result = analyze_failure_file(case['log_file'])
+            parsed = parse_file(Path(case['log_file']))
+            result = agent.analyze(failure_from_parsed_log(parsed))
             expected = case['expected']
             
             # Check 1: Classification
@@ -157,7 +184,19 @@ class EvaluationSuite:
         """Generate evaluation report"""
         
         total = len(self.results)
-        passed = sum(1 for r in self.results if r.passed)
+        
+        # Tally every check in one pass over the results
+        passed = classification = flaky = keywords = actions = confidence = 0
+        failed_cases = []
+        for r in self.results:
+            passed += r.passed
+            classification += r.classification_correct
+            flaky += r.flaky_score_correct
+            keywords += r.keywords_found
+            actions += r.actions_found
+            confidence += r.confidence_ok
+            if not r.passed:
+                failed_cases.append(r)
         failed = total - passed
         
         # Summary table
@@ -216,7 +255,6 @@ class EvaluationSuite:
         console.print()
         
         # Failed cases details
-        failed_cases = [r for r in self.results if not r.passed]
         if failed_cases:
             console.print("[bold red]❌ Failed Cases Details[/bold red]\n")
             
@@ -238,11 +276,11 @@ class EvaluationSuite:
         accuracy_table.add_column("Accuracy", style="yellow")
         
         checks = [
-            ("Classification", sum(1 for r in self.results if r.classification_correct)),
-            ("Flaky Score", sum(1 for r in self.results if r.flaky_score_correct)),
-            ("Keywords", sum(1 for r in self.results if r.keywords_found)),
-            ("Actions", sum(1 for r in self.results if r.actions_found)),
-            ("Confidence", sum(1 for r in self.results if r.confidence_ok))
+            ("Classification", classification),
+            ("Flaky Score", flaky),
+            ("Keywords", keywords),
+            ("Actions", actions),
+            ("Confidence", confidence)
         ]
         
         for check_name, correct in checks:
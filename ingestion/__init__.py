@@ -0,0 +1,3 @@
+"""
+Log ingestion - parsing CI output into structured failures
+"""
@@ -2,20 +2,138 @@
 CI Log Parser - Extracts structured data from test failure logs
 """
 
+import sys
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Optional
-from pathlib import Path
+from enum import IntEnum
+from functools import cached_property
+from typing import Iterable, List, Optional, Tuple, TYPE_CHECKING
+
+# numpy is only needed for context windows, so it is imported there and
+# parsing alone (including in parse_files workers) doesn't load it
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def _import_fast_parser():
+    """Compiled line loop, or None to parse in pure Python
+    
+    A prebuilt log_parser_fast extension is used as is. Building it from
+    the .pyx on import needs Cython and a C compiler, so pyximport is only
+    tried with TRIAGE_BUILD_CYTHON=1, and uninstalled again right after so
+    it doesn't hook any other imports.
+    """
+    try:
+        from ingestion.log_parser_fast import parse_log_iter
+        return parse_log_iter
+    except ImportError:
+        pass
+    
+    if os.environ.get("TRIAGE_BUILD_CYTHON") != "1":
+        return None
+    try:
+        import pyximport
+    except ImportError:
+        return None
+    
+    importers = pyximport.install(language_level=3)
+    try:
+        from ingestion.log_parser_fast import parse_log_iter
+        return parse_log_iter
+    except ImportError as e:
+        print(f"⚠️  Could not build ingestion/log_parser_fast.pyx: {e}")
+        return None
+    finally:
+        pyximport.uninstall(*importers)
+
+
+_parse_log_iter_fast = _import_fast_parser()
+USE_CYTHON = _parse_log_iter_fast is not None
+
+# Common log patterns, compiled once at import. These stay on stdlib re
+# rather than re2 (which agent/tools.py uses): none of them can backtrack
+# more than linearly, and re2's Python wrapper re-encodes every line to
+# UTF-8, which measured ~20x slower per line on the _LINE_RE fast path.
+_TS_RE = re.compile(r'\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\]')
+_LEVEL_RE = re.compile(r'(INFO|ERROR|FAIL|PASS|WARNING|NOTE)')
+_LEVEL_COLON_RE = re.compile(r'(INFO|ERROR|FAIL|PASS|WARNING|NOTE):')
+_TEST_RE = re.compile(r'test[_\w]+')
+_DUR_RE = re.compile(r'after (\d+)s')
+# Words with these endings are collected as screenshot artifacts
+_IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# Well-formed line: "[YYYY-MM-DD HH:MM:SS] LEVEL: message"
+_LINE_RE = re.compile(
+    r'^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\]\s*'
+    r'(INFO|ERROR|FAIL|PASS|WARNING|NOTE):\s*(.*)$'
+)
+
+# Levels whose messages count as error lines
+_ERROR_LEVELS = frozenset(('ERROR', 'FAIL'))
+
+
+class LogLevel(IntEnum):
+    """Integer code per log level, for the TestFailure.level_codes column"""
+    UNKNOWN = -1
+    INFO = 0
+    ERROR = 1
+    FAIL = 2
+    PASS = 3
+    WARNING = 4
+    NOTE = 5
+
+
+_LEVEL_CODES = {level.name: int(level) for level in LogLevel}
+_ERROR_CODES = [int(LogLevel.ERROR), int(LogLevel.FAIL)]
+
+# Matched level text maps to one shared string per level, so entries don't
+# each hold a copy and level tests hit the identity shortcut
+_LEVEL_INTERN = {
+    level: sys.intern(level)
+    for level in ('INFO', 'ERROR', 'FAIL', 'PASS', 'WARNING', 'NOTE')
+}
+
+
+def _parse_timestamp(value: str) -> Optional[datetime]:
+    """Build a datetime from a matched 'YYYY-MM-DD HH:MM:SS' string
+    
+    The regex has already checked the layout, so the fields are sliced
+    out directly instead of going through strptime. Returns None for
+    out-of-range values such as month 13.
+    """
+    try:
+        return datetime(
+            int(value[0:4]), int(value[5:7]), int(value[8:10]),
+            int(value[11:13]), int(value[14:16]), int(value[17:19])
+        )
+    except ValueError:
+        return None
 
 
 @dataclass
 class LogEntry:
     """Single log line with metadata"""
-    timestamp: Optional[datetime]
+    timestamp: Optional[str]  # 'YYYY-MM-DD HH:MM:SS' as logged, see timestamp_dt
     level: str  # INFO, ERROR, FAIL, etc.
     message: str
     raw_line: str
+    message_lower: str = ''  # message.lower(), computed once while parsing
+    
+    @cached_property
+    def timestamp_dt(self) -> Optional[datetime]:
+        """Timestamp as a datetime, parsed on first access"""
+        if self.timestamp is None:
+            return None
+        return _parse_timestamp(self.timestamp)
 
 
 @dataclass
@@ -30,51 +148,108 @@ class TestFailure:
     artifacts: List[str]  # screenshots, traces, etc.
     retry_count: int = 0
     
+    @cached_property
+    def level_codes(self) -> "np.ndarray":
+        """LogLevel code per entry as an int8 column, built on first use"""
+        import numpy as np
+        
+        return np.fromiter(
+            (_LEVEL_CODES.get(entry.level, LogLevel.UNKNOWN) for entry in self.log_entries),
+            dtype=np.int8,
+            count=len(self.log_entries)
+        )
+    
     def get_context_window(self, around_errors: int = 3) -> List[LogEntry]:
         """Get log entries around error lines for context"""
-        error_indices = [i for i, entry in enumerate(self.log_entries) 
-                        if entry.level in ['ERROR', 'FAIL']]
+        # numba is slow to import, so it's only pulled in when asked for
+        import numpy as np
+        from ingestion.window_numba import expand_window
         
-        context_indices = set()
-        for idx in error_indices:
-            start = max(0, idx - around_errors)
-            end = min(len(self.log_entries), idx + around_errors + 1)
-            context_indices.update(range(start, end))
+        error_indices = np.flatnonzero(np.isin(self.level_codes, _ERROR_CODES))
+        in_context = expand_window(error_indices, len(self.log_entries), around_errors)
         
-        return [self.log_entries[i] for i in sorted(context_indices)]
+        entries = self.log_entries
+        return [entries[i] for i in np.flatnonzero(in_context)]
 
 
 class LogParser:
     """Parse CI test logs into structured format"""
     
-    # Common log patterns
-    TIMESTAMP_PATTERN = r'\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\]'
-    LEVEL_PATTERN = r'(INFO|ERROR|FAIL|PASS|WARNING|NOTE)'
-    TEST_NAME_PATTERN = r'test[_\w]+'
-    TIMEOUT_PATTERN = r'Timeout (\d+)ms exceeded'
-    SELECTOR_PATTERN = r'selector ["\']([^"\']+)["\']'
-    DURATION_PATTERN = r'after (\d+)s'
-    
     def parse_file(self, filepath: Path) -> TestFailure:
         """Parse a log file into TestFailure object"""
-        with open(filepath, 'r') as f:
-            content = f.read()
+        # Iterate the file rather than read() + split(), so only one line
+        # is held as text at a time. mmap + bytes scanning doesn't help here:
+        # every LogEntry keeps its decoded raw_line, and on a 10MB log the
+        # mmap readline + per-line decode was ~25% slower than this loop.
+        with open(filepath, 'r', buffering=1 << 16) as f:
+            log_entries = self._parse_log_iter(f)
+        
+        return self._build_failure(log_entries)
+    
+    def parse_files(
+        self,
+        filepaths: List[Path],
+        max_workers: Optional[int] = None
+    ) -> List[TestFailure]:
+        """Parse many log files across processes, in input order
         
-        log_entries = self._parse_log_lines(content)
-        test_name = self._extract_test_name(log_entries)
-        error_lines = [e.message for e in log_entries if e.level in ['ERROR', 'FAIL']]
-        failure_message = self._extract_failure_message(log_entries)
-        error_type = self._classify_error_type(error_lines)
-        duration = self._extract_duration(log_entries)
-        artifacts = self._extract_artifacts(log_entries)
-        retry_count = self._count_retries(log_entries)
+        Parsing is pure-Python regex work and holds the GIL, so files are
+        spread over worker processes rather than threads.
+        """
+        workers = min(max_workers or os.cpu_count() or 1, len(filepaths))
+        if workers < 2:
+            return [self.parse_file(path) for path in filepaths]
         
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(self.parse_file, filepaths, chunksize=4))
+    
+    def _build_failure(self, entries: List[LogEntry]) -> TestFailure:
+        """Collect every TestFailure field in a single pass over the entries"""
+        test_name = None
+        duration = None
+        error_lines = []
+        error_text_parts = []
+        artifacts = []
+        retry_count = 0
+        
+        # Each check is gated on a cheap substring test, so most entries
+        # never reach a regex
+        for entry in entries:
+            message = entry.message
+            message_lower = entry.message_lower
+            
+            if entry.level in _ERROR_LEVELS:
+                error_lines.append(message)
+                error_text_parts.append(message_lower)
+            
+            if test_name is None and 'Starting test:' in message:
+                match = _TEST_RE.search(message)
+                if match:
+                    test_name = match.group(0)
+            
+            if duration is None and 'after ' in message:
+                match = _DUR_RE.search(message)
+                if match:
+                    duration = float(match.group(1))
+            
+            # split() + endswith measured faster than an equivalent findall
+            # regex (word-boundary lookarounds make it ~20% slower per message)
+            if 'screenshot' in message_lower:
+                artifacts.extend(
+                    word for word in message.split() if word.endswith(_IMAGE_EXTENSIONS)
+                )
+            
+            if 'retry attempt' in message_lower:
+                retry_count += 1
+        
+        # The failure message is the first error line, read from the list the
+        # loop already built rather than a second scan of the entries
         return TestFailure(
-            test_name=test_name,
-            failure_message=failure_message,
-            error_type=error_type,
+            test_name=test_name or "unknown_test",
+            failure_message=error_lines[0] if error_lines else "Unknown failure",
+            error_type=self._classify_error_type(' '.join(error_text_parts)),
             duration_seconds=duration,
-            log_entries=log_entries,
+            log_entries=entries,
             error_lines=error_lines,
             artifacts=artifacts,
             retry_count=retry_count
@@ -82,66 +257,79 @@ class LogParser:
     
     def _parse_log_lines(self, content: str) -> List[LogEntry]:
         """Parse individual log lines"""
+        return self._parse_log_iter(content.split('\n'))
+    
+    def _parse_log_iter(self, lines: Iterable[str]) -> List[LogEntry]:
+        """Parse log lines one at a time, with or without trailing newlines"""
+        if USE_CYTHON:
+            return _parse_log_iter_fast(lines, _LINE_RE, LogEntry, self._parse_line_slow)
+        
         entries = []
-        for line in content.split('\n'):
+        for line in lines:
+            line = line.rstrip('\n')
             if not line.strip():
                 continue
             
-            timestamp = self._extract_timestamp(line)
-            level = self._extract_level(line)
-            message = self._extract_message(line)
+            # One match covers the common format; anything else takes the
+            # per-field extractors. A hand-written slicing tokenizer was tried
+            # here: it was only ~20% faster without validating the digits and
+            # over 2x slower with it. Timestamps stay as the matched text;
+            # LogEntry.timestamp_dt parses them if anything asks.
+            match = _LINE_RE.match(line)
+            if match:
+                timestamp, level, message = match.groups()
+                level = _LEVEL_INTERN[level]
+                message = message.rstrip()
+            else:
+                timestamp, level, message = self._parse_line_slow(line)
             
             entries.append(LogEntry(
                 timestamp=timestamp,
                 level=level,
                 message=message,
-                raw_line=line
+                raw_line=line,
+                message_lower=message.lower()
             ))
         
         return entries
     
-    def _extract_timestamp(self, line: str) -> Optional[datetime]:
-        """Extract timestamp from log line"""
-        match = re.search(self.TIMESTAMP_PATTERN, line)
+    def _parse_line_slow(self, line: str) -> Tuple[Optional[str], str, str]:
+        """Per-field extraction for lines _LINE_RE doesn't match"""
+        return (
+            self._extract_timestamp(line),
+            self._extract_level(line),
+            self._extract_message(line)
+        )
+    
+    def _extract_timestamp(self, line: str) -> Optional[str]:
+        """Extract timestamp text from log line"""
+        match = _TS_RE.search(line)
         if match:
-            try:
-                return datetime.strptime(match.group(1), '%Y-%m-%d %H:%M:%S')
-            except ValueError:
-                pass
+            return match.group(1)
         return None
     
     def _extract_level(self, line: str) -> str:
         """Extract log level"""
-        match = re.search(self.LEVEL_PATTERN, line)
-        return match.group(1) if match else 'INFO'
+        # Only lines _LINE_RE rejects get here, and for those the level is the
+        # first level word anywhere in the line, with or without a colon.
+        # Slicing the text before the first ':' misreads "INFO retry ERROR:"
+        # and "DEBUG: ... FAIL", so the regex stays.
+        match = _LEVEL_RE.search(line)
+        return _LEVEL_INTERN[match.group(1)] if match else 'INFO'
     
     def _extract_message(self, line: str) -> str:
         """Extract message content"""
         # Remove timestamp and level prefix
-        msg = re.sub(self.TIMESTAMP_PATTERN, '', line)
-        msg = re.sub(f'{self.LEVEL_PATTERN}:', '', msg)
+        msg = _TS_RE.sub('', line)
+        msg = _LEVEL_COLON_RE.sub('', msg)
         return msg.strip()
     
-    def _extract_test_name(self, entries: List[LogEntry]) -> str:
-        """Find test name from log entries"""
-        for entry in entries:
-            if 'Starting test:' in entry.message:
-                match = re.search(self.TEST_NAME_PATTERN, entry.message)
-                if match:
-                    return match.group(0)
-        return "unknown_test"
-    
-    def _extract_failure_message(self, entries: List[LogEntry]) -> str:
-        """Get primary failure message"""
-        fail_entries = [e for e in entries if e.level in ['FAIL', 'ERROR']]
-        if fail_entries:
-            return fail_entries[0].message
-        return "Unknown failure"
-    
-    def _classify_error_type(self, error_lines: List[str]) -> Optional[str]:
-        """Classify error type from error messages"""
-        error_text = ' '.join(error_lines).lower()
-        
+    def _classify_error_type(self, error_text: str) -> Optional[str]:
+        """Classify error type from lowercased, joined error messages"""
+        # Kept as `in` tests in priority order. One grouped alternation regex
+        # would return the leftmost keyword instead ("selector ... timeout"
+        # became SelectorError), and measured 15-50x slower than these
+        # memchr-backed scans on joined error text.
         if 'timeout' in error_text:
             return 'TimeoutError'
         elif 'selector' in error_text or 'element not found' in error_text:
@@ -152,34 +340,12 @@ class LogParser:
             return 'DatabaseError'
         
         return None
-    
-    def _extract_duration(self, entries: List[LogEntry]) -> Optional[float]:
-        """Extract test duration in seconds"""
-        for entry in entries:
-            match = re.search(self.DURATION_PATTERN, entry.message)
-            if match:
-                return float(match.group(1))
-        return None
-    
-    def _extract_artifacts(self, entries: List[LogEntry]) -> List[str]:
-        """Find artifact references (screenshots, traces)"""
-        artifacts = []
-        for entry in entries:
-            if 'screenshot' in entry.message.lower():
-                # Extract filename from message
-                words = entry.message.split()
-                for word in words:
-                    if word.endswith(('.png', '.jpg', '.jpeg')):
-                        artifacts.append(word)
-        return artifacts
-    
-    def _count_retries(self, entries: List[LogEntry]) -> int:
-        """Count retry attempts"""
-        retry_count = 0
-        for entry in entries:
-            if 'retry attempt' in entry.message.lower():
-                retry_count += 1
-        return retry_count
+
+
+# LogParser holds no state, so one shared instance serves every caller
+_DEFAULT_PARSER = LogParser()
+parse_file = _DEFAULT_PARSER.parse_file
+parse_files = _DEFAULT_PARSER.parse_files
 
 
 # CLI usage
@@ -201,8 +367,7 @@ if __name__ == "__main__":
     
     print(f"\n🔍 Parsing log file: {log_file}\n")
     
-    parser = LogParser()
-    failure = parser.parse_file(Path(log_file))
+    failure = parse_file(Path(log_file))
     
     print(f"📋 Test: {failure.test_name}")
     print(f"❌ Error: {failure.failure_message}")
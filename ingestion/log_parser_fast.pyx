@@ -0,0 +1,51 @@
+# cython: language_level=3
+"""
+Compiled line loop for LogParser - prebuilt, or built on import with TRIAGE_BUILD_CYTHON=1
+"""
+
+cimport cython
+from sys import intern
+
+
+cdef tuple _parse_line_fast(object line_match, str line):
+    """(timestamp, level, message) for a well-formed line, else None"""
+    match = line_match(line)
+    if match is None:
+        return None
+    timestamp, level, message = match.groups()
+    # Same shared strings as log_parser._LEVEL_INTERN
+    return timestamp, intern(level), message.rstrip()
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def parse_log_iter(object lines, object line_re, object entry_type, object fallback):
+    """Build entry_type objects for every non-blank line
+
+    Lines line_re doesn't match go through fallback(line), which returns
+    the same (timestamp, level, message) tuple.
+    """
+    cdef list entries = []
+    cdef object line_match = line_re.match
+    cdef str line, message
+    cdef tuple fields
+
+    for raw in lines:
+        line = raw.rstrip('\n')
+        if not line.strip():
+            continue
+
+        fields = _parse_line_fast(line_match, line)
+        if fields is None:
+            fields = fallback(line)
+        message = fields[2]
+
+        entries.append(entry_type(
+            timestamp=fields[0],
+            level=fields[1],
+            message=message,
+            raw_line=line,
+            message_lower=message.lower()
+        ))
+
+    return entries
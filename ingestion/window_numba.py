@@ -0,0 +1,58 @@
+"""
+Context-window masks for TestFailure.get_context_window
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+    USE_NUMBA = True
+except ImportError:
+    USE_NUMBA = False
+
+
+def _expand_window_loop(error_indices, n, k):
+    """Single pass over sorted error indices, compiled by numba
+
+    Writes start from where the previous window ended, so each mask
+    slot is set at most once however much the windows overlap.
+    """
+    mask = np.zeros(n, dtype=np.bool_)
+    covered = 0
+    for i in range(error_indices.shape[0]):
+        idx = error_indices[i]
+        start = max(idx - k, covered)
+        end = min(idx + k + 1, n)
+        for j in range(start, end):
+            mask[j] = True
+        if end > covered:
+            covered = end
+    return mask
+
+
+def _expand_window_numpy(error_indices, n, k):
+    """Same mask from a difference array
+
+    Each window adds +1 at its start and -1 past its end; a running sum
+    is then positive exactly inside at least one window.
+    """
+    starts = np.maximum(error_indices - k, 0)
+    ends = np.minimum(error_indices + k + 1, n)
+    depth = np.bincount(starts, minlength=n + 1) - np.bincount(ends, minlength=n + 1)
+    return np.cumsum(depth[:n]) > 0
+
+
+if USE_NUMBA:
+    _expand_window = njit(cache=True)(_expand_window_loop)
+else:
+    _expand_window = _expand_window_numpy
+
+
+def expand_window(error_indices: np.ndarray, n: int, k: int) -> np.ndarray:
+    """Boolean mask of the n entries within k of any error index
+
+    error_indices must be sorted ascending, as np.flatnonzero returns them.
+    """
+    return _expand_window(
+        np.ascontiguousarray(error_indices, dtype=np.int64), int(n), int(k)
+    )
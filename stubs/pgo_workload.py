@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Training workload for profile-guided (PGO) builds of lancedb / pylance
+Run from project root: python stubs/pgo_workload.py [--copies 10000]
+
+Exercises the same Lance code paths the agent hits - bulk write, ANN
+index build, vector search and filtered scans - against the sample
+failures replicated many times. See "Optional: PGO builds" in README.md.
+"""
+
+import sys
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import argparse
+import copy
+import shutil
+import tempfile
+import time
+from typing import List, Tuple
+
+import numpy as np
+import pyarrow as pa
+
+from agent.memory import FailureMemory, FAILURES_SCHEMA
+from agent.models import SAMPLE_HISTORICAL_FAILURES, HistoricalFailure
+import config
+
+
+def build_workload_rows(
+    memory: FailureMemory, copies: int
+) -> Tuple[pa.Table, List[HistoricalFailure]]:
+    """Sample rows tiled `copies` times, with jittered vectors and unique names
+
+    Also returns the sample failures, to use as search queries.
+    """
+    samples = [
+        HistoricalFailure.from_dict(copy.deepcopy(data))
+        for data in SAMPLE_HISTORICAL_FAILURES
+    ]
+    base = memory._build_rows(samples)
+
+    # Only the three samples are embedded; copies get noise added so the
+    # ANN index has real clusters to train on
+    rng = np.random.default_rng(0)
+    base_vectors = (
+        base.column("vector").combine_chunks().flatten()
+        .to_numpy().reshape(-1, config.EMBEDDING_DIM)
+    )
+    vectors = np.tile(base_vectors, (copies, 1))
+    vectors += rng.normal(0, 0.05, vectors.shape).astype(np.float32)
+
+    rows = pa.concat_tables([base] * copies)
+    n = rows.num_rows
+    names = [f"{name}_{i // len(samples)}" for i, name in
+             enumerate(rows.column("test_name").to_pylist())]
+
+    rows = rows.set_column(
+        FAILURES_SCHEMA.get_field_index("id"), "id",
+        pa.array([f"pgo-{i}" for i in range(n)])
+    )
+    rows = rows.set_column(
+        FAILURES_SCHEMA.get_field_index("test_name"), "test_name", pa.array(names)
+    )
+    rows = rows.set_column(
+        FAILURES_SCHEMA.get_field_index("vector"), "vector",
+        pa.FixedSizeListArray.from_arrays(
+            pa.array(vectors.ravel(), type=pa.float32()), config.EMBEDDING_DIM
+        )
+    )
+    return rows.cast(FAILURES_SCHEMA), samples
+
+
+def run_workload(copies: int, queries: int):
+    db_dir = Path(tempfile.mkdtemp(prefix="pgo_failures_"))
+    try:
+        memory = FailureMemory(str(db_dir))
+        rows, samples = build_workload_rows(memory, copies)
+
+        start = time.perf_counter()
+        memory.table = memory._create_table(rows, mode="overwrite")
+        memory._ensure_ann_index()
+        print(f"✓ Wrote and indexed {rows.num_rows} rows in "
+              f"{time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        for i in range(queries):
+            sample = samples[i % len(samples)]
+            memory.search_similar(sample, top_k=5)
+            memory.get_by_test_name(f"{sample.test_name}_{i % copies}")
+            memory.get_flaky_tests(threshold=0.6)
+        print(f"✓ Ran {queries} query rounds in {time.perf_counter() - start:.1f}s")
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--copies", type=int, default=10_000,
+                        help="Times to replicate the sample failures")
+    parser.add_argument("--queries", type=int, default=2_000,
+                        help="Search + scan rounds to run")
+    args = parser.parse_args()
+
+    run_workload(args.copies, args.queries)
@@ -22,7 +22,8 @@ from agent.models import (
 )
 from agent.tools import AgentTools
 from agent.memory import FailureMemory
-from ingestion.log_parser import LogParser
+from agent.cache import SemanticCache
+from ingestion.log_parser import parse_file, parse_files
 
 
 class TestLogParser:
@@ -30,13 +31,12 @@ class TestLogParser:
     
     def test_parse_timeout_log(self):
         """Test parsing timeout error"""
-        parser = LogParser()
         log_file = Path("demo/sample_ci_failures/test_login_timeout.log")
         
         if not log_file.exists():
             pytest.skip("Sample log file not found")
         
-        result = parser.parse_file(log_file)
+        result = parse_file(log_file)
         
         assert result.test_name == "test_user_login"
         assert result.error_type == "TimeoutError"
@@ -45,17 +45,81 @@ class TestLogParser:
     
     def test_parse_selector_log(self):
         """Test parsing selector error"""
-        parser = LogParser()
         log_file = Path("demo/sample_ci_failures/test_selector_changed.log")
         
         if not log_file.exists():
             pytest.skip("Sample log file not found")
         
-        result = parser.parse_file(log_file)
+        result = parse_file(log_file)
         
         assert result.test_name == "test_add_to_cart"
         assert "selector" in result.failure_message.lower()
         assert result.duration_seconds == 31.0
+    
+    def test_parse_files_matches_parse_file(self, tmp_path):
+        """Test parallel parsing returns the same results, in order"""
+        paths = []
+        for i in range(3):
+            path = tmp_path / f"test_{i}.log"
+            path.write_text(
+                f"[2024-01-15 10:00:0{i}] INFO: Starting test: test_case_{i}\n"
+                f"[2024-01-15 10:00:0{i}] ERROR: Timeout {i}000ms exceeded after {i}s\n"
+            )
+            paths.append(path)
+        
+        results = parse_files(paths, max_workers=2)
+        
+        assert [r.test_name for r in results] == ["test_case_0", "test_case_1", "test_case_2"]
+        assert results == [parse_file(path) for path in paths]
+    
+    @pytest.mark.parametrize("levels", [
+        ["INFO"] * 6,  # No errors
+        [],
+        ["ERROR"] + ["INFO"] * 7,  # Error at index 0
+        ["INFO"] * 7 + ["FAIL"],  # Error at n-1
+        ["INFO", "ERROR", "INFO", "FAIL", "INFO", "INFO", "INFO", "ERROR", "INFO"],
+    ])
+    @pytest.mark.parametrize("around", [0, 1, 3])
+    def test_context_window_matches_set_based_window(self, levels, around):
+        """Test both window kernels and get_context_window match a set of ranges"""
+        import numpy as np
+        from ingestion import window_numba
+        from ingestion.log_parser import LogEntry, TestFailure
+        
+        n = len(levels)
+        expected = set()
+        for idx, level in enumerate(levels):
+            if level in ("ERROR", "FAIL"):
+                expected.update(range(max(0, idx - around), min(n, idx + around + 1)))
+        expected = sorted(expected)
+        
+        error_indices = np.array(
+            [i for i, level in enumerate(levels) if level in ("ERROR", "FAIL")],
+            dtype=np.int64
+        )
+        kernels = (
+            window_numba._expand_window,  # numba-compiled when available
+            window_numba._expand_window_loop,
+            window_numba._expand_window_numpy,
+        )
+        for kernel in kernels:
+            mask = kernel(error_indices, n, around)
+            assert np.flatnonzero(mask).tolist() == expected
+        
+        entries = [
+            LogEntry(timestamp=None, level=level, message=str(i), raw_line=str(i))
+            for i, level in enumerate(levels)
+        ]
+        failure = TestFailure(
+            test_name="test_window",
+            failure_message="",
+            error_type=None,
+            duration_seconds=None,
+            log_entries=entries,
+            error_lines=[],
+            artifacts=[]
+        )
+        assert failure.get_context_window(around) == [entries[i] for i in expected]
 
 
 class TestAgentTools:
@@ -76,6 +140,17 @@ class TestAgentTools:
             resolution=None
         )
     
+    @pytest.fixture
+    def resolved_failure(self, sample_failure):
+        """The sample failure with a resolution"""
+        from dataclasses import replace
+        
+        return replace(sample_failure, resolution=Resolution(
+            root_cause="Slow render",
+            classification=FailureType.TIMEOUT,
+            fix_applied="Increased timeout"
+        ))
+    
     def test_classify_timeout(self, sample_failure):
         """Test timeout classification"""
         memory = FailureMemory()
@@ -115,6 +190,142 @@ class TestAgentTools:
         
         assert score >= 0.4  # Should be flaky if retries succeeded
     
+    def test_flaky_score_with_resolved_history(self, sample_failure, resolved_failure):
+        """Test flaky score counts resolutions in a plain-list history"""
+        tools = AgentTools(memory=None)
+        
+        base = tools.calculate_flaky_score(sample_failure, [sample_failure] * 2)
+        score = tools.calculate_flaky_score(
+            sample_failure, [resolved_failure, sample_failure]
+        )
+        
+        assert score == pytest.approx(base + 0.1)  # Resolved and unresolved history
+    
+    def test_compute_scores_matches_calculate_flaky_score(
+        self, sample_failure, resolved_failure
+    ):
+        """Test vectorized scores match the per-failure calculation"""
+        import numpy as np
+        from dataclasses import replace
+        from agent.flaky_numba import compute_scores, FLAKY_ERROR_TYPES
+        
+        tools = AgentTools(memory=None)
+        cases = [
+            (retry_count, error_type, history_len, resolved)
+            for retry_count in (0, 2)
+            for error_type in ("NetworkError", "TimeoutError", "AssertionError")
+            for history_len in range(5)
+            for resolved in range(history_len + 1)
+        ]
+        
+        expected = [
+            tools.calculate_flaky_score(
+                replace(sample_failure, retry_count=retry_count, error_type=error_type),
+                [resolved_failure] * resolved + [sample_failure] * (history_len - resolved)
+            )
+            for retry_count, error_type, history_len, resolved in cases
+        ]
+        retry_counts, error_types, history_lens, resolved_counts = zip(*cases)
+        scores = compute_scores(
+            np.array(retry_counts),
+            np.array(resolved_counts),
+            np.isin(error_types, FLAKY_ERROR_TYPES),
+            np.array(history_lens)
+        )
+        
+        # Exact, not approx: a float32 0.69999999 would miss a 0.7 threshold
+        assert scores.tolist() == expected
+    
+    def test_numba_kernel_matches_numpy(self):
+        """Test the compiled scoring loop matches the numpy version"""
+        import numpy as np
+        from agent import flaky_numba
+        
+        rng = np.random.default_rng(0)
+        history_lens = rng.integers(0, 6, 1000).astype(np.int32)
+        args = (
+            rng.integers(0, 3, 1000).astype(np.int32),
+            (rng.random(1000) * (history_lens + 1)).astype(np.int32),
+            rng.random(1000) < 0.5,
+            history_lens
+        )
+        
+        np.testing.assert_array_equal(
+            flaky_numba._compute_scores(*args),
+            flaky_numba._compute_scores_numpy(*args)
+        )
+    
+    def test_get_flaky_tests(self, tmp_path, monkeypatch):
+        """Test flaky tests rank by the higher of stored and recomputed score"""
+        import numpy as np
+        import config
+        
+        memory = FailureMemory(str(tmp_path / "db"))
+        # Scoring never reads the vectors, so skip the embedding model
+        monkeypatch.setattr(
+            memory, "_embed_texts",
+            lambda texts, stored=False: np.zeros(
+                (len(texts), config.EMBEDDING_DIM), dtype=np.float32
+            )
+        )
+        
+        def failure(test_name, error_type, retry_count=0, flaky_score=0.0):
+            return HistoricalFailure(
+                test_name=test_name,
+                error_message=f"{error_type} in {test_name}",
+                error_type=error_type,
+                log_snippet="",
+                timestamp=datetime(2024, 1, 15),
+                duration_seconds=1.0,
+                retry_count=retry_count,
+                artifacts=[],
+                resolution=None,
+                flaky_score=flaky_score
+            )
+        
+        memory.add_failures_bulk([
+            *[failure("test_stable", "AssertionError") for _ in range(3)],  # 0.3
+            failure("test_retried", "NetworkError", retry_count=1),  # 0.6
+            failure("test_marked", "AssertionError", flaky_score=0.9),  # stored
+            *[failure("test_boundary", "AssertionError", retry_count=1)
+              for _ in range(3)],  # 0.4 + 0.3, exactly 0.7
+        ])
+        
+        flaky = memory.get_flaky_tests(threshold=0.5)
+        
+        assert flaky.test_names == [
+            "test_marked", "test_boundary", "test_boundary", "test_boundary",
+            "test_retried"
+        ]
+        # Same float sums as calculate_flaky_score
+        assert flaky.flaky_scores.tolist() == [0.9] + [0.4 + 0.3] * 3 + [0.4 + 0.2]
+        assert len(memory.get_flaky_tests(threshold=0.7)) == 4
+    
+    def test_fast_triage_retried_network_error(self, sample_failure):
+        """Test fast triage short-circuits a network error that passed on retry"""
+        sample_failure.error_type = "NetworkError"
+        sample_failure.error_message = "RequestError: connect ECONNREFUSED"
+        sample_failure.log_snippet = "Succeeded on retry 2/3"
+        sample_failure.retry_count = 2
+        
+        tools = AgentTools(memory=None)
+        result = tools.fast_triage(sample_failure)
+        
+        assert result is not None
+        assert result.classification == FailureType.NETWORK
+        assert result.flaky_probability >= 0.6
+    
+    def test_fast_triage_skips_ambiguous_keyword(self, sample_failure):
+        """Test a lone generic keyword does not short-circuit the pipeline"""
+        sample_failure.error_type = "TypeError"
+        sample_failure.error_message = "Cannot read property 'data' of undefined"
+        sample_failure.log_snippet = "at renderProfile (profile.js:42)"
+        sample_failure.retry_count = 0
+        
+        tools = AgentTools(memory=None)
+        
+        assert tools.fast_triage(sample_failure) is None
+    
     def test_suggest_actions_timeout(self, sample_failure):
         """Test action suggestions for timeout"""
         memory = FailureMemory()
@@ -172,6 +383,26 @@ class TestModels:
         assert failure.test_name == "test_example"
         assert isinstance(failure.timestamp, datetime)
     
+    def test_historical_failure_from_dict_arrow_timestamp(self):
+        """Test deserialization from datetime and epoch microseconds"""
+        data = {
+            'test_name': "test_example",
+            'error_message': "Error",
+            'error_type': "TimeoutError",
+            'log_snippet': "log",
+            'timestamp': 1705314225000000,  # 2024-01-15T10:23:45
+            'duration_seconds': 10.0,
+            'retry_count': 0,
+            'artifacts': [],
+            'resolution': None
+        }
+        
+        failure = HistoricalFailure.from_dict(dict(data))
+        assert failure.timestamp == datetime(2024, 1, 15, 10, 23, 45)
+        
+        data['timestamp'] = failure.timestamp
+        assert HistoricalFailure.from_dict(data).timestamp == failure.timestamp
+    
     def test_triage_result_report(self):
         """Test report generation"""
         result = TriageResult(
@@ -192,5 +423,165 @@ class TestModels:
         assert "30.0%" in report or "30%" in report
 
 
+class TestStreamExplanation:
+    """Test early stopping of streamed LLM explanations"""
+    
+    @staticmethod
+    def stream(chunks):
+        """Agent whose LLM streams chunks as cumulative text, like Ollama"""
+        from types import SimpleNamespace
+        from agent.planner import TriageAgent
+        
+        def stream_complete(prompt):
+            text = ""
+            for chunk in chunks:
+                text += chunk
+                yield SimpleNamespace(text=text)
+        
+        agent = TriageAgent.__new__(TriageAgent)
+        agent.llm = SimpleNamespace(stream_complete=stream_complete)
+        return agent._stream_explanation("prompt")
+    
+    def test_stops_after_max_sentences(self):
+        """Test streaming stops once enough sentences are complete"""
+        text = self.stream([
+            "The page loaded slowly. ", "The selector timed out. ",
+            "It waited 30.5s. ", "Then it ", "failed."
+        ])
+        
+        assert text == "The page loaded slowly. The selector timed out. It waited 30.5s."
+    
+    def test_numbered_answer_is_not_cut(self):
+        """Test list numbers and abbreviations don't count as sentence ends"""
+        chunks = [
+            "1. What went wrong: the dashboard, e.g. the header, ",
+            "was hidden after 30s. ", "2. Why: ", "an animation. ",
+            "3. Past failures: ", "same fix."
+        ]
+        
+        assert self.stream(chunks) == "".join(chunks)
+
+
+class TestBatchSignatures:
+    """Test batch analysis reuse across repeated failures"""
+    
+    @pytest.fixture
+    def failure(self):
+        return HistoricalFailure(
+            test_name="test_upload",
+            error_message="Error: /tmp/run-123/upload.bin missing after 30000ms",
+            error_type="TimeoutError",
+            log_snippet="",
+            timestamp=datetime.now(),
+            duration_seconds=30.0,
+            retry_count=0,
+            artifacts=[],
+            resolution=None
+        )
+    
+    def test_signature_normalizes_paths_and_numbers(self, failure):
+        """Run-specific paths and numbers don't change the signature"""
+        from dataclasses import replace
+        from cli import _error_signature
+        
+        rerun = replace(
+            failure, error_message="Error: /tmp/run-987/upload.bin missing after 31000ms"
+        )
+        
+        assert _error_signature(rerun) == _error_signature(failure)
+        assert _error_signature(replace(failure, retry_count=1)) != _error_signature(failure)
+        assert _error_signature(replace(failure, error_type="NetworkError")) != _error_signature(failure)
+    
+    def test_concurrent_repeats_analyzed_once(self, failure):
+        """Repeats arriving while the first is in flight wait for its result"""
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from cli import _signature_cached
+        
+        calls = []
+        release = threading.Event()
+        
+        def slow_analyze(f):
+            calls.append(f)
+            release.wait(timeout=5)
+            return f.test_name
+        
+        analyze = _signature_cached(slow_analyze)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(analyze, failure) for _ in range(4)]
+            release.set()
+            results = [f.result() for f in futures]
+        
+        assert results == ["test_upload"] * 4
+        assert len(calls) == 1
+
+
+class TestSemanticCache:
+    """Test semantic result cache"""
+    
+    @pytest.fixture
+    def sample_result(self):
+        return TriageResult(
+            test_name="test_example",
+            classification=FailureType.TIMEOUT,
+            flaky_probability=0.3,
+            root_cause_explanation="Element loading timeout",
+            suggested_actions=["Increase timeout"],
+            confidence_score=0.8,
+            similar_failures=[],
+            reasoning_steps=[]
+        )
+    
+    def test_hit_on_near_duplicate(self, tmp_path, sample_result):
+        """Near-identical query vectors reuse the cached result"""
+        import numpy as np
+        
+        cache = SemanticCache(path=tmp_path / "cache.npz")
+        vec = np.ones(384, dtype=np.float32)
+        cache.add(vec, sample_result, ("test_example", "TimeoutError", 0))
+        cache.save()
+        
+        reloaded = SemanticCache(path=tmp_path / "cache.npz")
+        result = reloaded.lookup(vec * 1.01, ("test_example", "TimeoutError", 0))
+        assert result.test_name == "test_example"
+    
+    def test_miss_on_different_key(self, tmp_path, sample_result):
+        """Identical vectors stored under another key do not hit"""
+        import numpy as np
+        
+        cache = SemanticCache(path=tmp_path / "cache.npz")
+        vec = np.ones(384, dtype=np.float32)
+        cache.add(vec, sample_result, ("test_example", "TimeoutError", 0))
+        
+        assert cache.lookup(vec, ("test_example", "TimeoutError", 1)) is None
+        assert cache.lookup(vec, ("test_other", "TimeoutError", 0)) is None
+    
+    def test_oldest_entries_dropped_beyond_max(self, tmp_path, sample_result):
+        """Adding past max_entries evicts the oldest result"""
+        import numpy as np
+        
+        cache = SemanticCache(path=tmp_path / "cache.npz", max_entries=2)
+        vecs = np.eye(3, 384, dtype=np.float32)
+        for vec in vecs:
+            cache.add(vec, sample_result)
+        
+        assert len(cache.results) == 2
+        assert cache.lookup(vecs[0]) is None
+        assert cache.lookup(vecs[2]) is not None
+    
+    def test_miss_on_dissimilar(self, tmp_path, sample_result):
+        """Dissimilar query vectors do not hit the cache"""
+        import numpy as np
+        
+        cache = SemanticCache(path=tmp_path / "cache.npz")
+        vec = np.zeros(384, dtype=np.float32)
+        vec[0] = 1.0
+        cache.add(vec, sample_result)
+        
+        other = np.zeros(384, dtype=np.float32)
+        other[1] = 1.0
+        assert cache.lookup(other) is None
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file